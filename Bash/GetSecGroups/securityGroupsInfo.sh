@@ -7,6 +7,7 @@ policy_name="InstanceSecurityGroupScannerPolicy"
 output_file="instance_security_groups.csv"
 instances_file="instances_id.txt"
 regions=$(aws ec2 describe-regions --query "Regions[*].RegionName" --output text)
+python_dir="$(cd "$(dirname "$0")/../../Python" && pwd)"
 
 # Function to check if IAM role exists
 check_iam_role() {
@@ -63,22 +64,29 @@ scan_instances_and_export() {
         exit 1
     fi
 
+    # Resolve all instance regions in one batched pass (cached in ~/.cache/aws-scripts)
+    declare -A instance_regions
+    while read -r instance_id region; do
+        instance_regions[$instance_id]=$region
+    done < <(PYTHONPATH="$python_dir" python3 -m common.region_index --file "$instances_file" --regions $regions)
+
     while IFS= read -r instance_id; do
+        [ -z "$instance_id" ] && continue
         echo "Processing instance: $instance_id"
-        for region in $regions; do
-            echo "Checking instance $instance_id in region: $region"
-            security_groups=$(aws ec2 describe-instances --region $region --instance-ids $instance_id --query "Reservations[*].Instances[*].SecurityGroups[*].GroupId" --output text 2>/dev/null)
+        region=${instance_regions[$instance_id]}
+        if [ -z "$region" ]; then
+            echo "Instance $instance_id not found in any region. Skipping..."
+            continue
+        fi
+
+        security_groups=$(aws ec2 describe-instances --region $region --instance-ids $instance_id --query "Reservations[*].Instances[*].SecurityGroups[*].GroupId" --output text 2>/dev/null)
 
-            if [ -n "$security_groups" ]; then
-                for sg_id in $security_groups; do
-                    inbound_rules=$(aws ec2 describe-security-groups --region $region --group-ids $sg_id --query "SecurityGroups[*].IpPermissions" --output json | jq -c .[])
-                    outbound_rules=$(aws ec2 describe-security-groups --region $region --group-ids $sg_id --query "SecurityGroups[*].IpPermissionsEgress" --output json | jq -c .[])
+        for sg_id in $security_groups; do
+            inbound_rules=$(aws ec2 describe-security-groups --region $region --group-ids $sg_id --query "SecurityGroups[*].IpPermissions" --output json | jq -c .[])
+            outbound_rules=$(aws ec2 describe-security-groups --region $region --group-ids $sg_id --query "SecurityGroups[*].IpPermissionsEgress" --output json | jq -c .[])
 
-                    echo "$counter,$account_id,$region,$instance_id,$sg_id,$inbound_rules,$outbound_rules" >> $output_file
-                    counter=$((counter + 1))
-                done
-                break
-            fi
+            echo "$counter,$account_id,$region,$instance_id,$sg_id,$inbound_rules,$outbound_rules" >> $output_file
+            counter=$((counter + 1))
         done
     done < "$instances_file"
 
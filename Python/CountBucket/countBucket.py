@@ -0,0 +1,268 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import unquote
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client, set_max_pool_connections
+from common.throttling import print_api_summary
+
+BUCKET = "wingate-28"
+PREFIX = "00D0K0000024T2yUAE/"
+DELIMITER = "/"   # Splits the prefix into the sub-prefixes totals are reported for
+MAX_WORKERS = 8   # Sub-prefixes listed at the same time
+PROGRESS_EVERY = 100000  # Objects between progress lines
+
+
+class PrefixTotals:
+    """
+    Thread-safe object count and size per (sub-prefix, storage class).
+
+    Memory grows with the number of distinct sub-prefixes, never with the
+    number of objects. Prefixes or inventory files that could not be read are
+    kept in failed, so the totals can be reported as incomplete.
+    """
+
+    def __init__(self, prefix, delimiter=DELIMITER):
+        self.prefix = prefix
+        self.delimiter = delimiter
+        self.lock = threading.Lock()
+        self.totals = {}
+        self.objects = 0
+        self.failed = []
+
+    def sub_prefix(self, key):
+        """Return the first level below the prefix a key belongs to."""
+        if not self.delimiter:
+            return self.prefix
+        rest = key[len(self.prefix):]
+        index = rest.find(self.delimiter)
+        return self.prefix if index < 0 else self.prefix + rest[:index + len(self.delimiter)]
+
+    def add_page(self, entries):
+        """Aggregate (key, size, storage_class) entries locally, then merge them under the lock."""
+        page = {}
+        count = 0
+        for key, size, storage_class in entries:
+            counters = page.setdefault((self.sub_prefix(key), storage_class), [0, 0])
+            counters[0] += 1
+            counters[1] += size
+            count += 1
+
+        with self.lock:
+            for group, (objects, size) in page.items():
+                counters = self.totals.setdefault(group, [0, 0])
+                counters[0] += objects
+                counters[1] += size
+            before = self.objects
+            self.objects += count
+            if self.objects // PROGRESS_EVERY > before // PROGRESS_EVERY:
+                print(f"Counted {self.objects} objects...")
+
+    def by_sub_prefix(self):
+        totals = {}
+        for (sub_prefix, _), (objects, size) in self.totals.items():
+            counters = totals.setdefault(sub_prefix, [0, 0])
+            counters[0] += objects
+            counters[1] += size
+        return totals
+
+    def by_storage_class(self):
+        totals = {}
+        for (_, storage_class), (objects, size) in self.totals.items():
+            counters = totals.setdefault(storage_class, [0, 0])
+            counters[0] += objects
+            counters[1] += size
+        return totals
+
+
+def page_entries(page):
+    for obj in page.get("Contents", []):
+        yield obj["Key"], obj["Size"], obj.get("StorageClass", "STANDARD")
+
+
+def count_prefix(s3_client, bucket, prefix, totals):
+    """Stream every page of a prefix into totals without keeping the listing."""
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        totals.add_page(page_entries(page))
+
+
+def count_bucket(bucket, prefix, delimiter=DELIMITER, max_workers=MAX_WORKERS):
+    """
+    Count and size the objects under a prefix.
+
+    With a delimiter, the first listing level is read once to find the
+    sub-prefixes, which are then listed concurrently.
+    """
+    set_max_pool_connections(max_workers)
+    s3_client = get_client("s3")
+    totals = PrefixTotals(prefix, delimiter)
+
+    if not delimiter or max_workers <= 1:
+        count_prefix(s3_client, bucket, prefix, totals)
+        return totals
+
+    partitions = []
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter=delimiter):
+        totals.add_page(page_entries(page))  # Objects directly under the prefix
+        partitions.extend(common["Prefix"] for common in page.get("CommonPrefixes", []))
+    print(f"Listing {len(partitions)} sub-prefixes with {max_workers} workers...")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(count_prefix, s3_client, bucket, partition, totals): partition
+                   for partition in partitions}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error listing prefix {futures[future]}: {e}")
+                totals.failed.append(futures[future])
+    return totals
+
+
+def inventory_data_files(manifest_file):
+    """
+    Return (file_format, columns, paths) for a locally downloaded S3 Inventory manifest.
+
+    Data files are looked up next to the manifest, either under their full
+    key or by file name.
+    """
+    with open(manifest_file, "r") as file:
+        manifest = json.load(file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    paths = []
+    for entry in manifest["files"]:
+        path = os.path.join(base_dir, entry["key"])
+        if not os.path.exists(path):
+            path = os.path.join(base_dir, os.path.basename(entry["key"]))
+        paths.append(path)
+
+    columns = [column.strip() for column in manifest.get("fileSchema", "").split(",")]
+    return manifest["fileFormat"].upper(), columns, paths
+
+
+def iter_inventory_csv(path, columns, prefix):
+    key_index = columns.index("Key")
+    size_index = columns.index("Size")
+    class_index = columns.index("StorageClass") if "StorageClass" in columns else None
+    # Inventories of versioned buckets list every version; only current objects are counted
+    latest_index = columns.index("IsLatest") if "IsLatest" in columns else None
+    marker_index = columns.index("IsDeleteMarker") if "IsDeleteMarker" in columns else None
+
+    with gzip.open(path, "rt", newline="") as file:
+        for row in csv.reader(file):
+            if latest_index is not None and row[latest_index].lower() != "true":
+                continue
+            if marker_index is not None and row[marker_index].lower() == "true":
+                continue
+            key = unquote(row[key_index])  # Inventory CSV keys are URL-encoded
+            if not key.startswith(prefix) or not row[size_index]:
+                continue  # Delete markers have no size
+            storage_class = row[class_index] if class_index is not None else "STANDARD"
+            yield key, int(row[size_index]), storage_class
+
+
+def iter_inventory_parquet(path, prefix):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow is required to read Parquet inventories (pip install pyarrow).")
+        sys.exit(1)
+
+    parquet_file = pq.ParquetFile(path)
+    names = set(parquet_file.schema_arrow.names)
+    columns = [name for name in ("key", "size", "storage_class", "is_latest", "is_delete_marker") if name in names]
+    for batch in parquet_file.iter_batches(columns=columns):
+        data = batch.to_pydict()
+        classes = data.get("storage_class") or ["STANDARD"] * batch.num_rows
+        # Inventories of versioned buckets list every version; only current objects are counted
+        latest = data.get("is_latest") or [True] * batch.num_rows
+        markers = data.get("is_delete_marker") or [False] * batch.num_rows
+        for key, size, storage_class, is_latest, is_delete_marker in zip(data["key"], data["size"], classes,
+                                                                          latest, markers):
+            if is_latest is False or is_delete_marker:
+                continue
+            if key.startswith(prefix) and size is not None:
+                yield key, size, storage_class or "STANDARD"
+
+
+def count_inventory(manifest_file, prefix, delimiter=DELIMITER, max_workers=MAX_WORKERS):
+    """Aggregate the objects under a prefix from S3 Inventory files instead of listing the bucket."""
+    file_format, columns, paths = inventory_data_files(manifest_file)
+    if file_format not in ("CSV", "PARQUET"):
+        print(f"Unsupported inventory format {file_format}; use CSV or Parquet.")
+        sys.exit(1)
+
+    totals = PrefixTotals(prefix, delimiter)
+
+    def read_file(path):
+        entries = iter_inventory_csv(path, columns, prefix) if file_format == "CSV" else iter_inventory_parquet(path, prefix)
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= 1000:
+                totals.add_page(batch)
+                batch = []
+        totals.add_page(batch)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(read_file, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error reading inventory file {futures[future]}: {e}")
+                totals.failed.append(futures[future])
+    return totals
+
+
+def print_report(totals, elapsed):
+    print(f"{'Sub-prefix':<60} {'Objects':>12} {'Size (bytes)':>18}")
+    for sub_prefix, (objects, size) in sorted(totals.by_sub_prefix().items()):
+        print(f"{sub_prefix:<60} {objects:>12} {size:>18}")
+
+    print(f"\n{'Storage class':<60} {'Objects':>12} {'Size (bytes)':>18}")
+    for storage_class, (objects, size) in sorted(totals.by_storage_class().items()):
+        print(f"{storage_class:<60} {objects:>12} {size:>18}")
+
+    total_size = sum(size for _, size in totals.totals.values())
+    rate = totals.objects / elapsed if elapsed else 0.0
+    print(f"\nFinal Total Size: {total_size} bytes")
+    print(f"Final Total Count: {totals.objects}")
+    print(f"Counted in {elapsed:.2f}s ({rate:.0f} objects/s)")
+    if totals.failed:
+        print(f"INCOMPLETE: {len(totals.failed)} prefixes or inventory files could not be read; "
+              f"the totals above leave them out.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count the objects and bytes under an S3 prefix.")
+    parser.add_argument("--bucket", default=BUCKET, help="Bucket to list")
+    parser.add_argument("--prefix", default=PREFIX, help="Prefix to count")
+    parser.add_argument("--delimiter", default=DELIMITER, help="Sub-prefix delimiter ('' to disable partitioning)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Sub-prefixes listed at the same time")
+    parser.add_argument("--inventory", metavar="MANIFEST", help="Local S3 Inventory manifest.json to read instead of listing")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.inventory:
+        totals = count_inventory(args.inventory, args.prefix, args.delimiter, args.workers)
+    else:
+        totals = count_bucket(args.bucket, args.prefix, args.delimiter, args.workers)
+    print_report(totals, time.perf_counter() - start)
+    print_api_summary()
+    if totals.failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client
+from common.region_index import describe_instances_by_id
+from common.sweep import enabled_regions
+from common.throttling import print_api_summary
+from common.writers import FORMATS, open_writer, output_path
+
+# Variables
+INSTANCES_FILE = "instances_id.txt"
+OUTPUT_FILE = "instance_security_groups.csv"
+FIELDNAMES = ["counter", "account_number", "region", "instance_id", "security_group_id", "inbound_rules", "outbound_rules"]
+
+GROUP_CHUNK_SIZE = 200      # Group IDs per describe_security_groups filter
+MAX_WORKERS = 10            # Regions audited at the same time
+
+
+def describe_security_groups(ec2_client, group_ids):
+    """Return {group_id: security_group} with every group fetched exactly once."""
+    security_groups = {}
+    paginator = ec2_client.get_paginator("describe_security_groups")
+    for i in range(0, len(group_ids), GROUP_CHUNK_SIZE):
+        chunk = group_ids[i:i + GROUP_CHUNK_SIZE]
+        for page in paginator.paginate(Filters=[{"Name": "group-id", "Values": chunk}]):
+            for group in page["SecurityGroups"]:
+                security_groups[group["GroupId"]] = group
+    return security_groups
+
+
+def audit_region(ec2_client, region, groups_by_instance):
+    """
+    Return (instance_id, group_id, inbound_rules, outbound_rules) rows for a region's instances.
+
+    Instances sharing a security group reuse the same describe_security_groups
+    result, and both rule directions come from that single response.
+
+    :param groups_by_instance: Dictionary {instance_id: [security_group_id, ...]} of the region's instances.
+    """
+    distinct_groups = sorted({group_id for group_ids in groups_by_instance.values() for group_id in group_ids})
+    security_groups = describe_security_groups(ec2_client, distinct_groups)
+
+    rows = []
+    for instance_id, group_ids in groups_by_instance.items():
+        for group_id in group_ids:
+            group = security_groups.get(group_id, {})
+            inbound_rules = json.dumps(group.get("IpPermissions", []), separators=(",", ":"))
+            outbound_rules = json.dumps(group.get("IpPermissionsEgress", []), separators=(",", ":"))
+            rows.append((instance_id, group_id, inbound_rules, outbound_rules))
+
+    print(f"{region}: {len(groups_by_instance)} instances, {len(distinct_groups)} distinct security groups")
+    return rows
+
+
+def iter_security_group_records(instance_ids, max_workers=MAX_WORKERS):
+    """Yield one record per (instance, security group) as each region's audit finishes."""
+    account_id = get_client("sts").get_caller_identity()["Account"]
+    regions = enabled_regions(get_client("ec2"))
+
+    # Find and describe every instance in one batched pass (regions cached in ~/.cache/aws-scripts);
+    # its security groups come from that same describe_instances response
+    instances = describe_instances_by_id(instance_ids, regions)
+    groups_by_region = {}
+    for instance_id in instance_ids:
+        if instance_id not in instances:
+            print(f"Instance {instance_id} not found in any region. Skipping...")
+            continue
+        region, instance = instances[instance_id]
+        groups_by_region.setdefault(region, {})[instance_id] = [group["GroupId"] for group in instance.get("SecurityGroups", [])]
+
+    counter = 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(audit_region, get_client("ec2", region), region, groups): region
+            for region, groups in groups_by_region.items()
+        }
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                print(f"Could not audit security groups in region {region}: {e}")
+                continue
+            for instance_id, group_id, inbound_rules, outbound_rules in rows:
+                yield dict(zip(FIELDNAMES, [counter, account_id, region, instance_id, group_id, inbound_rules, outbound_rules]))
+                counter += 1
+
+
+def scan_instances_and_export(instances_file=INSTANCES_FILE, output_file=OUTPUT_FILE, max_workers=MAX_WORKERS, fmt=None):
+    if not os.path.isfile(instances_file):
+        print(f"Instances file '{instances_file}' not found!")
+        sys.exit(1)
+
+    with open(instances_file, "r") as file:
+        instance_ids = [line.strip() for line in file if line.strip()]
+
+    print("Scanning instances and exporting data...")
+    start = time.perf_counter()
+    with open_writer(output_file, FIELDNAMES, fmt) as writer:
+        writer.write_all(iter_security_group_records(instance_ids, max_workers))
+
+    print(f"Audited {len(instance_ids)} instances in {time.perf_counter() - start:.2f}s.")
+    print(f"Data exported to {output_file}.")
+    print_api_summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the security group rules of a list of EC2 instances.")
+    parser.add_argument("--instances-file", default=INSTANCES_FILE, help="File with one instance ID per line")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="File to write")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: from the file extension)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Regions audited at the same time")
+    args = parser.parse_args(argv)
+
+    output_file = output_path(args.output, args.format) if args.output == OUTPUT_FILE else args.output
+    scan_instances_and_export(args.instances_file, output_file, args.workers, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,173 @@
-import boto3
+import argparse
 import os
+import queue
+import random
+import sqlite3
+import sys
+import threading
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import instrumentation
+from common.clients import get_client, set_max_pool_connections
+from common.throttling import INITIAL_RATES, MAX_RATE, note_throttle, print_api_summary, set_rate
+
+BUCKET_NAME = 'lennarcorporation-140'  # Substitua pelo nome do seu bucket
+PREFIXES_FILE = 'files.txt'            # Substitua pelo caminho do arquivo de texto
+
+BATCH_SIZE = 1000      # Maximum keys per delete_objects call
+DELETE_WORKERS = 8     # Concurrent delete_objects calls
+PREFIX_WORKERS = 4     # Prefixes listed at the same time
+QUEUE_SIZE = 32        # Batches buffered between listing and deleting
+MAX_RETRIES = 5        # Retries for keys reported in the Errors response
+# Per-key and per-call error codes worth retrying; any other error fails the key at once
+RETRYABLE_CODES = {'SlowDown', 'InternalError', 'ServiceUnavailable', 'RequestTimeout', 'OperationAborted',
+                   'RequestFailed'}
+CHECKPOINT_FILE = 'delete_checkpoint.db'  # Progress journal; delete it to start over
+
+class DeleteCheckpoint:
+    """
+    SQLite journal of deletion progress per (bucket, prefix).
+
+    Stores the list_object_versions markers up to which every version is known
+    to be deleted, and whether the prefix finished, so a restart resumes there.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS prefixes ("
+                " bucket TEXT, prefix TEXT, key_marker TEXT, version_id_marker TEXT,"
+                " deleted INTEGER DEFAULT 0, completed INTEGER DEFAULT 0,"
+                " PRIMARY KEY (bucket, prefix))"
+            )
+
+    def load(self, bucket_name, prefix):
+        """Return (completed, key_marker, version_id_marker, deleted) for a prefix."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT completed, key_marker, version_id_marker, deleted FROM prefixes WHERE bucket = ? AND prefix = ?",
+                (bucket_name, prefix)
+            ).fetchone()
+        return (bool(row[0]), row[1], row[2], row[3]) if row else (False, None, None, 0)
+
+    def save(self, bucket_name, prefix, key_marker, version_id_marker, deleted, completed=False):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO prefixes VALUES (?, ?, ?, ?, ?, ?)",
+                (bucket_name, prefix, key_marker, version_id_marker, deleted, int(completed))
+            )
+
+    def close(self):
+        self.conn.close()
+
+class PrefixProgress:
+    """
+    Tracks which listing pages of a prefix have been deleted.
+
+    Batches finish out of order, so markers only advance past a page once it
+    and every page before it were fully deleted.
+    """
+
+    def __init__(self, key_marker=None, version_id_marker=None, deleted=0):
+        self.key_marker = key_marker
+        self.version_id_marker = version_id_marker
+        self.deleted = deleted
+        self.failed = 0
+        self.listed = False
+        self.pending = {}   # seq -> markers after that page
+        self.done = set()
+        self.frontier = -1  # Highest seq with all earlier pages deleted
+
+    def add_page(self, seq, key_marker, version_id_marker):
+        self.pending[seq] = (key_marker, version_id_marker)
+
+    def finish_page(self, seq, deleted, failed):
+        """Record a deleted page; return True if the resume markers moved forward."""
+        self.deleted += deleted
+        self.failed += failed
+        if failed:
+            return False
+
+        self.done.add(seq)
+        advanced = False
+        while self.frontier + 1 in self.done:
+            self.frontier += 1
+            self.done.remove(self.frontier)
+            self.key_marker, self.version_id_marker = self.pending.pop(self.frontier)
+            advanced = True
+        return advanced
+
+    @property
+    def completed(self):
+        return self.listed and not self.failed and not self.pending
+
+def iter_version_batches(s3_client, bucket_name, prefix, key_marker=None, version_id_marker=None):
+    """
+    Stream every object version and delete marker under a prefix, one batch per listing page.
+
+    Unversioned objects are listed with VersionId "null", so this also covers
+    buckets that never had versioning enabled. A page holds at most 1000 entries,
+    which is also the delete_objects limit.
+
+    :return: Generator of (batch, next_key_marker, next_version_id_marker); markers are None on the last page.
+    """
+    paginator = s3_client.get_paginator('list_object_versions')
+    params = {'Bucket': bucket_name, 'Prefix': prefix, 'MaxKeys': BATCH_SIZE}
+    if key_marker:
+        params['KeyMarker'] = key_marker
+        params['VersionIdMarker'] = version_id_marker
+
+    for page in paginator.paginate(**params):
+        batch = [{'Key': version['Key'], 'VersionId': version['VersionId']}
+                 for version in page.get('Versions', []) + page.get('DeleteMarkers', [])]
+        if batch:
+            yield batch, page.get('NextKeyMarker'), page.get('NextVersionIdMarker')
+
+def delete_objects_in_batch(s3_client, bucket_name, batch):
+    """
+    Delete a batch of keys, retrying only the keys S3 reports as failed with a retryable code.
+
+    Keys failing with any other code (e.g. AccessDenied) are given up on immediately.
+
+    :return: Tuple of (number of keys deleted, list of errors left after the last retry).
+    """
+    pending = batch
+    errors = []
+    failed = []
+    for attempt in range(MAX_RETRIES + 1):
+        if attempt:
+            time.sleep(random.uniform(0, min(2 ** attempt, 30)))  # Jittered backoff
 
-def delete_objects_in_batch(bucket_name, delete_keys):
-    s3 = boto3.client('s3')
-    batch_size = 1000
-    for i in range(0, len(delete_keys), batch_size):
-        batch = delete_keys[i:i + batch_size]
         try:
-            s3.delete_objects(
+            response = s3_client.delete_objects(
                 Bucket=bucket_name,
-                Delete={'Objects': batch}
+                Delete={'Objects': pending, 'Quiet': True}
             )
+            errors = response.get('Errors', [])
+            if any(error['Code'] == 'SlowDown' for error in errors):
+                note_throttle(s3_client)
         except Exception as e:
             print(f"Error during batch delete: {e}")
+            code = e.response['Error']['Code'] if isinstance(e, ClientError) else 'RequestFailed'
+            errors = [dict(obj, Code=code, Message=str(e)) for obj in pending]
 
-def collect_objects_for_deletion(bucket, prefix):
-    delete_keys = []
+        failed.extend(error for error in errors if error['Code'] not in RETRYABLE_CODES)
+        errors = [error for error in errors if error['Code'] in RETRYABLE_CODES]
+        if not errors:
+            break
+        pending = [{'Key': error['Key'], 'VersionId': error['VersionId']} if error.get('VersionId') else {'Key': error['Key']}
+                   for error in errors]
 
-    # Coletar versões de objetos e delete markers
-    versions_to_delete = bucket.object_versions.filter(Prefix=prefix)
-    for version in versions_to_delete:
-        delete_keys.append({'Key': version.object_key, 'VersionId': version.id})
-
-    # Coletar objetos mais recentes
-    objects_to_delete = bucket.objects.filter(Prefix=prefix)
-    for obj in objects_to_delete:
-        delete_keys.append({'Key': obj.key})
-
-    return delete_keys
-
-def delete_objects_from_file(bucket_name, file_path):
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucket_name)
+    failed.extend(errors)
+    return len(batch) - len(failed), failed
 
+def delete_objects_from_file(bucket_name, file_path, delete_workers=DELETE_WORKERS, prefix_workers=PREFIX_WORKERS,
+                             checkpoint_file=CHECKPOINT_FILE):
     if not os.path.isfile(file_path):
         print(f"O arquivo {file_path} não existe.")
         return
@@ -44,20 +179,102 @@ def delete_objects_from_file(bucket_name, file_path):
         print("O arquivo de texto está vazio ou não contém prefixos válidos.")
         return
 
+    checkpoint = DeleteCheckpoint(checkpoint_file)
+    progress = {}
     for prefix in prefixes_to_delete:
-        delete_keys = collect_objects_for_deletion(bucket, prefix)
-
-        if delete_keys:
-            while delete_keys:
-                delete_objects_in_batch(bucket_name, delete_keys)
-                delete_keys = collect_objects_for_deletion(bucket, prefix)
-            
-            print(f"Successfully deleted all objects for prefix: {prefix}")
+        completed, key_marker, version_id_marker, deleted = checkpoint.load(bucket_name, prefix)
+        if completed:
+            print(f"Prefix {prefix} already deleted in a previous run. Skipping...")
+            continue
+        if key_marker:
+            print(f"Resuming prefix {prefix} after key {key_marker} ({deleted} keys already deleted)")
+        progress[prefix] = PrefixProgress(key_marker, version_id_marker, deleted)
+
+    # One client shared by all threads, with enough connections for every worker
+    set_max_pool_connections(delete_workers + prefix_workers)
+    s3 = get_client('s3')
+
+    # Listing threads feed batches into a bounded queue so memory stays flat
+    batches = queue.Queue(maxsize=QUEUE_SIZE)
+    progress_lock = threading.Lock()
+    deleted_this_run = [0]
+
+    def delete_worker():
+        while True:
+            item = batches.get()
+            if item is None:
+                break
+            prefix, seq, batch = item
+            deleted, errors = delete_objects_in_batch(s3, bucket_name, batch)
+            for error in errors:
+                print(f"Failed to delete {error['Key']} ({error.get('VersionId')}): {error['Code']} {error['Message']}")
+            with progress_lock:
+                state = progress[prefix]
+                deleted_this_run[0] += deleted
+                if state.finish_page(seq, deleted, len(errors)):
+                    checkpoint.save(bucket_name, prefix, state.key_marker, state.version_id_marker, state.deleted)
+
+    def list_prefix(prefix):
+        state = progress[prefix]
+        pages = iter_version_batches(s3, bucket_name, prefix, state.key_marker, state.version_id_marker)
+        for seq, (batch, key_marker, version_id_marker) in enumerate(pages):
+            with progress_lock:
+                state.add_page(seq, key_marker, version_id_marker)
+            batches.put((prefix, seq, batch))
+        with progress_lock:
+            state.listed = True
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=delete_worker, daemon=True) for _ in range(delete_workers)]
+    for worker in workers:
+        worker.start()
+
+    with ThreadPoolExecutor(max_workers=prefix_workers) as executor:
+        futures = {executor.submit(list_prefix, prefix): prefix for prefix in progress}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error listing prefix {futures[future]}: {e}")
+
+    for _ in workers:
+        batches.put(None)
+    for worker in workers:
+        worker.join()
+
+    elapsed = time.perf_counter() - start
+    for prefix, state in progress.items():
+        if state.completed:
+            checkpoint.save(bucket_name, prefix, None, None, state.deleted, completed=True)
+        if state.failed:
+            print(f"Deleted {state.deleted} keys for prefix {prefix}; {state.failed} keys could not be deleted.")
+        elif not state.completed:
+            print(f"Prefix {prefix} was not fully processed ({state.deleted} keys deleted); run again to resume.")
+        elif state.deleted:
+            print(f"Successfully deleted all objects for prefix: {prefix} ({state.deleted} keys)")
         else:
             print(f"No objects found for prefix: {prefix}")
+    checkpoint.close()
+
+    total_deleted = deleted_this_run[0]
+    print(f"Deleted {total_deleted} keys in {elapsed:.1f}s ({total_deleted / elapsed if elapsed else 0:.0f} keys/s).")
+    print_api_summary()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete every object version under the prefixes listed in a file.")
+    parser.add_argument('--bucket', default=BUCKET_NAME, help="Bucket to delete from")
+    parser.add_argument('--file', default=PREFIXES_FILE, help="File with one prefix per line")
+    parser.add_argument('--delete-workers', type=int, default=DELETE_WORKERS, help="Concurrent delete_objects calls")
+    parser.add_argument('--prefix-workers', type=int, default=PREFIX_WORKERS, help="Prefixes listed at the same time")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help="Progress journal used to resume")
+    parser.add_argument('--rate', type=float, default=INITIAL_RATES['s3'],
+                        help="Starting S3 calls per second; it adapts to SlowDown responses from there")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
+    set_rate('s3', args.rate, max(args.rate, MAX_RATE))
+
+    delete_objects_from_file(args.bucket, args.file, args.delete_workers, args.prefix_workers, args.checkpoint)
 
 if __name__ == "__main__":
-    bucket_name = 'lennarcorporation-140'  # Substitua pelo nome do seu bucket
-    file_path = 'files.txt'  # Substitua pelo caminho do arquivo de texto
-    
-    delete_objects_from_file(bucket_name, file_path)
\ No newline at end of file
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import csv
+import hashlib
+import os
+import sys
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client
+from common.sweep import enabled_regions
+from common.throttling import print_api_summary
+
+# Define the SSM document YAML file
+SSM_DOCUMENT_YAML = "docContent.yaml"
+
+# Name for the SSM document
+SSM_DOCUMENT_NAME = "ARM-GroupPassword"
+
+# CSV file to log created documents
+CSV_FILE = "doc_created.csv"
+FIELDNAMES = ["Region", "Action"]
+
+MAX_WORKERS = 10  # Regions rolled out at the same time
+
+
+def has_instances(ec2_client):
+    """Return True if the region has any instance, using a single small describe_instances call."""
+    response = ec2_client.describe_instances(MaxResults=5)
+    # A page may come back empty while more results remain
+    return bool(response["Reservations"] or response.get("NextToken"))
+
+
+def rollout_document(ssm_client, ec2_client, name, content, content_hash):
+    """
+    Bring a region's document to the given content and make it the default version.
+
+    An unchanged document costs a single describe_document call; only regions
+    that need a write are checked for instances.
+
+    :return: "created", "updated", "unchanged" or "skipped" (no instances in the region).
+    """
+    try:
+        document = ssm_client.describe_document(Name=name)["Document"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "InvalidDocument":
+            raise
+        document = None
+
+    if document and document.get("HashType", "Sha256") == "Sha256" and document.get("Hash") == content_hash:
+        return "unchanged"
+    if not has_instances(ec2_client):
+        return "skipped"
+
+    if document is None:
+        # The first version of a new document is its default version
+        ssm_client.create_document(
+            Name=name,
+            Content=content,
+            DocumentType="Command",
+            DocumentFormat="YAML",
+            TargetType="/AWS::EC2::Instance"
+        )
+        return "created"
+
+    try:
+        version = ssm_client.update_document(
+            Name=name,
+            Content=content,
+            DocumentFormat="YAML",
+            TargetType="/AWS::EC2::Instance",
+            DocumentVersion="$LATEST"
+        )["DocumentDescription"]["DocumentVersion"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "DuplicateDocumentContent":
+            raise
+        # The latest version already has this content but is not the default one
+        version = ssm_client.describe_document(Name=name, DocumentVersion="$LATEST")["Document"]["DocumentVersion"]
+
+    ssm_client.update_document_default_version(Name=name, DocumentVersion=version)
+    return "updated"
+
+
+def rollout_region(region, name, content, content_hash):
+    """Return the action taken in a region; regions without instances are skipped."""
+    return rollout_document(get_client("ssm", region), get_client("ec2", region), name, content, content_hash)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create or update an SSM document in every region with instances.")
+    parser.add_argument("--file", default=SSM_DOCUMENT_YAML, help="Document content (YAML)")
+    parser.add_argument("--name", default=SSM_DOCUMENT_NAME, help="SSM document name")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Regions rolled out at the same time")
+    args = parser.parse_args(argv)
+
+    # Ensure the SSM document YAML exists
+    if not os.path.isfile(args.file):
+        print(f"Error: {args.file} not found. Please ensure the file exists in the current directory.")
+        sys.exit(1)
+
+    with open(args.file, "r") as file:
+        content = file.read()
+    # SSM reports the SHA-256 of each version's content, so one hash decides whether a region needs an update
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    start = time.perf_counter()
+    regions = enabled_regions(get_client("ec2"))
+    results = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(rollout_region, region, args.name, content, content_hash): region
+                   for region in regions}
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                action = future.result()
+            except Exception as e:
+                print(f"Error rolling out SSM document {args.name} in region {region}: {e}")
+                continue
+            if action == "skipped":
+                print(f"No instances found in region {region}. Skipping.")
+                continue
+            results[region] = action
+            print(f"SSM document {args.name} {action} in region {region}.")
+
+    with open(CSV_FILE, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDNAMES)
+        for region in sorted(results):
+            writer.writerow([region, results[region]])
+
+    actions = list(results.values())
+    print(f"Rolled out to {len(results)} regions in {time.perf_counter() - start:.2f}s: "
+          f"{actions.count('created')} created, {actions.count('updated')} updated, "
+          f"{actions.count('unchanged')} unchanged.")
+    print(f"Document creation log is available in {CSV_FILE}.")
+    print_api_summary()
+
+
+if __name__ == "__main__":
+    main()
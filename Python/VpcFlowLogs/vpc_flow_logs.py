@@ -0,0 +1,208 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client
+from common.sweep import enabled_regions
+from common.throttling import print_api_summary
+
+# Variables
+ROLE_NAME = "VPCFlowLogsRole"
+POLICY_NAME = "VPCFlowLogsPolicy"
+CHANGED_VPCS_FILE = "changed_vpcs_file.csv"
+FIELDNAMES = ["Number", "Region", "VPC ID", "Log Group Name", "Status"]
+
+LOG_GROUP_PREFIX = "vpc/flow-logs/"
+FLOW_LOG_CHUNK_SIZE = 25  # Resource IDs per create_flow_logs call
+MAX_WORKERS = 10          # Regions processed at the same time
+
+ASSUME_ROLE_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": {"Service": ["vpc-flow-logs.amazonaws.com"]},
+            "Action": "sts:AssumeRole"
+        }
+    ]
+}
+ROLE_POLICY = {
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Action": [
+                "logs:CreateLogGroup",
+                "logs:CreateLogStream",
+                "logs:PutLogEvents",
+                "logs:DescribeLogGroups",
+                "logs:DescribeLogStreams",
+                "cloudwatch:*"
+            ],
+            "Resource": "*"
+        }
+    ]
+}
+
+
+def create_iam_role():
+    """Create the role flow logs deliver with, unless it exists. Returns its ARN."""
+    iam_client = get_client("iam")
+    try:
+        role = iam_client.get_role(RoleName=ROLE_NAME)["Role"]
+        print(f"IAM role {ROLE_NAME} already exists. Skipping creation.")
+    except iam_client.exceptions.NoSuchEntityException:
+        role = iam_client.create_role(RoleName=ROLE_NAME, AssumeRolePolicyDocument=json.dumps(ASSUME_ROLE_POLICY))["Role"]
+        iam_client.put_role_policy(RoleName=ROLE_NAME, PolicyName=POLICY_NAME, PolicyDocument=json.dumps(ROLE_POLICY))
+        print(f"IAM Role {ROLE_NAME} created.")
+    return role["Arn"]
+
+
+def vpcs_without_flow_logs(ec2_client):
+    """Return the region's VPC IDs without an active flow log, from one paginated listing of each."""
+    vpc_ids = [
+        vpc["VpcId"]
+        for page in ec2_client.get_paginator("describe_vpcs").paginate()
+        for vpc in page["Vpcs"]
+    ]
+    covered = {
+        flow_log["ResourceId"]
+        for page in ec2_client.get_paginator("describe_flow_logs").paginate()
+        for flow_log in page["FlowLogs"]
+        if flow_log.get("FlowLogStatus") == "ACTIVE"
+    }
+    return [vpc_id for vpc_id in vpc_ids if vpc_id not in covered]
+
+
+def ensure_log_groups(logs_client, log_group_names, retention_days):
+    """Create missing log groups and set their retention where it differs."""
+    existing = {
+        group["logGroupName"]: group.get("retentionInDays")
+        for page in logs_client.get_paginator("describe_log_groups").paginate(logGroupNamePrefix=LOG_GROUP_PREFIX)
+        for group in page["logGroups"]
+    }
+    for log_group_name in sorted(set(log_group_names)):
+        if log_group_name not in existing:
+            logs_client.create_log_group(logGroupName=log_group_name)
+        if existing.get(log_group_name) != retention_days:
+            logs_client.put_retention_policy(logGroupName=log_group_name, retentionInDays=retention_days)
+
+
+def create_flow_logs(ec2_client, vpc_ids, log_group_name, role_arn, flow_log_name):
+    """
+    Create flow logs for several VPCs sharing a log group, FLOW_LOG_CHUNK_SIZE per call.
+
+    :return: {vpc_id: error message} for the VPCs that failed.
+    """
+    failed = {}
+    for i in range(0, len(vpc_ids), FLOW_LOG_CHUNK_SIZE):
+        response = ec2_client.create_flow_logs(
+            ResourceType="VPC",
+            ResourceIds=vpc_ids[i:i + FLOW_LOG_CHUNK_SIZE],
+            TrafficType="ALL",
+            LogDestinationType="cloud-watch-logs",
+            LogGroupName=log_group_name,
+            DeliverLogsPermissionArn=role_arn,
+            TagSpecifications=[{
+                "ResourceType": "vpc-flow-log",
+                "Tags": [{"Key": "Name", "Value": flow_log_name}]
+            }]
+        )
+        for item in response.get("Unsuccessful", []):
+            failed[item["ResourceId"]] = item["Error"]["Message"]
+    return failed
+
+
+def process_region(region, retention_days, role_arn, per_vpc_log_group=False, dry_run=False):
+    """
+    Enable flow logs on every VPC of a region that lacks one.
+
+    By default the region's VPCs share one log group and are enabled in
+    batches of FLOW_LOG_CHUNK_SIZE. With per_vpc_log_group each VPC gets its
+    own log group; create_flow_logs takes a single log group, so that layout
+    costs one call per VPC.
+
+    :return: List of (vpc_id, log_group_name, status).
+    """
+    ec2_client = get_client("ec2", region)
+    missing = vpcs_without_flow_logs(ec2_client)
+    print(f"{region}: {len(missing)} VPCs without flow logs")
+    if not missing:
+        return []
+
+    if per_vpc_log_group:
+        groups = {LOG_GROUP_PREFIX + vpc_id: [vpc_id] for vpc_id in missing}
+    else:
+        groups = {LOG_GROUP_PREFIX + region: missing}
+
+    if dry_run:
+        return [(vpc_id, name, "missing") for name, vpc_ids in groups.items() for vpc_id in vpc_ids]
+
+    ensure_log_groups(get_client("logs", region), groups, retention_days)
+
+    results = []
+    for log_group_name, vpc_ids in groups.items():
+        flow_log_name = f"ar-vpc-flowlogs-{vpc_ids[0] if per_vpc_log_group else region}"
+        try:
+            failed = create_flow_logs(ec2_client, vpc_ids, log_group_name, role_arn, flow_log_name)
+        except Exception as e:
+            failed = {vpc_id: str(e) for vpc_id in vpc_ids}
+        for vpc_id in vpc_ids:
+            if vpc_id in failed:
+                print(f"Could not create flow log for VPC {vpc_id} in region {region}: {failed[vpc_id]}")
+            results.append((vpc_id, log_group_name, "failed" if vpc_id in failed else "created"))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enable VPC flow logs to CloudWatch Logs where they are missing.")
+    parser.add_argument("retention_days", type=int, help="Log group retention in days")
+    parser.add_argument("regions", nargs="+", help="Regions to process, or 'all'")
+    parser.add_argument("--per-vpc-log-group", action="store_true",
+                        help="Give each VPC its own log group (one create_flow_logs call per VPC) "
+                             "instead of one batched log group per region")
+    parser.add_argument("--dry-run", action="store_true", help="Only report VPCs without flow logs")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Regions processed at the same time")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    regions = enabled_regions(get_client("ec2")) if args.regions == ["all"] else args.regions
+    role_arn = None if args.dry_run else create_iam_role()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(process_region, region, args.retention_days, role_arn, args.per_vpc_log_group, args.dry_run): region
+            for region in regions
+        }
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                results[region] = future.result()
+            except Exception as e:
+                print(f"Error processing region {region}: {e}")
+
+    counter = 0
+    with open(CHANGED_VPCS_FILE, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(FIELDNAMES)
+        for region in sorted(results):
+            for vpc_id, log_group_name, status in results[region]:
+                counter += 1
+                writer.writerow([counter, region, vpc_id, log_group_name, status])
+
+    statuses = [status for rows in results.values() for _, _, status in rows]
+    print(f"Processed {len(regions)} regions in {time.perf_counter() - start:.2f}s: "
+          f"{statuses.count('created')} flow logs created, {statuses.count('failed')} failed, "
+          f"{statuses.count('missing')} missing.")
+    print(f"Script execution completed. Check {CHANGED_VPCS_FILE} for details on VPCs that had flow logs enabled.")
+    print_api_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# Regions and services clients are built for, like a multi-region sweep
+REGIONS = ["us-east-1", "us-east-2", "us-west-1", "us-west-2", "eu-west-1", "eu-central-1",
+           "ap-south-1", "ap-southeast-1", "ap-northeast-1", "sa-east-1"]
+SERVICES = ["ec2", "s3", "cloudwatch", "events"]
+IMPORT_RUNS = 5  # Fresh interpreters started per import measurement
+
+
+def import_time(statement):
+    """Return the best wall time in ms of running an import in a fresh interpreter."""
+    python_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    best = float("inf")
+    for _ in range(IMPORT_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=python_dir, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def time_pass(build):
+    """Return the ms spent getting a client for every (region, service) pair."""
+    start = time.perf_counter()
+    for region in REGIONS:
+        for service in SERVICES:
+            build(service, region)
+    return (time.perf_counter() - start) * 1000
+
+
+def time_calls(build, passes):
+    """Return (first pass ms, average later pass ms)."""
+    first = time_pass(build)
+    later = [time_pass(build) for _ in range(passes - 1)]
+    return first, sum(later) / len(later) if later else first
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure startup and per-region client construction overhead.")
+    parser.add_argument("--passes", type=int, default=5, help="Passes over every (region, service) pair")
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    import boto3
+    from common import clients
+    from common.throttling import make_client
+
+    pairs = len(REGIONS) * len(SERVICES)
+    print(f"Startup (best of {IMPORT_RUNS} fresh interpreters):")
+    print(f"  {'python -c pass':<40} {import_time('pass'):>9.1f} ms")
+    print(f"  {'import boto3':<40} {import_time('import boto3'):>9.1f} ms")
+    print(f"  {'import common.sessions, common.sweep':<40} {import_time('import common.sessions, common.sweep'):>9.1f} ms")
+
+    print(f"\nClients for {len(REGIONS)} regions x {len(SERVICES)} services ({pairs} pairs), {args.passes} passes:")
+    print(f"  {'Strategy':<40} {'First pass':>12} {'Later passes':>14} {'Per client':>12}")
+    strategies = [
+        ("boto3.client per call (before)", lambda service, region: boto3.client(service, region_name=region)),
+        ("make_client on default session", lambda service, region: make_client(service, region)),
+        ("clients.get_client registry (after)", lambda service, region: clients.get_client(service, region)),
+    ]
+    for name, build in strategies:
+        clients.clear()
+        first, repeat = time_calls(build, args.passes)
+        print(f"  {name:<40} {first:>9.1f} ms {repeat:>11.1f} ms {repeat / pairs:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import argparse
+import gzip
+import importlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cli import COMMANDS, PYTHON_DIR
+
+# Account and regions of the synthetic estate; --regions takes the first N
+ACCOUNT_ID = "123456789012"
+REGIONS = ["us-east-1", "us-east-2", "us-west-1", "us-west-2", "ca-central-1", "sa-east-1", "eu-west-1",
+           "eu-west-2", "eu-west-3", "eu-central-1", "eu-north-1", "eu-south-1", "ap-south-1", "ap-southeast-1",
+           "ap-southeast-2", "ap-northeast-1", "ap-northeast-2", "ap-northeast-3", "me-south-1", "af-south-1"]
+AMI_ID = "ami-12c6146b"  # An image moto ships with
+BUCKET = "bench-bucket"
+S3_PREFIXES = 16  # Top-level prefixes the synthetic versions are spread over
+MODIFY_VOLUME_SHARE = 0.01  # Share of synthetic CloudTrail records that are ModifyVolume events
+
+# Services whose wire protocol is looked up for throttle injection
+SERVICES = ["ec2", "rds", "s3", "cloudtrail", "cloudwatch", "events", "sts"]
+
+# Injected throttling responses per wire protocol: (HTTP status, body).
+# Protocols not listed (e.g. CBOR) are only delayed.
+THROTTLE_RESPONSES = {
+    "ec2": (400, "<Response><Errors><Error><Code>RequestLimitExceeded</Code><Message>Injected</Message>"
+                 "</Error></Errors><RequestID>benchmark</RequestID></Response>"),
+    "query": (400, "<ErrorResponse><Error><Type>Sender</Type><Code>Throttling</Code><Message>Injected</Message>"
+                   "</Error><RequestId>benchmark</RequestId></ErrorResponse>"),
+    "rest-xml": (503, "<Error><Code>SlowDown</Code><Message>Injected</Message></Error>"),
+    "json": (400, '{"__type": "ThrottlingException", "message": "Injected"}'),
+    "rest-json": (429, '{"__type": "TooManyRequestsException", "message": "Injected"}'),
+}
+
+# Relative increase of API calls or RSS growth over --baseline reported as a regression
+REGRESSION_TOLERANCE = 0.10
+
+def load_tool(group, command):
+    """Import a script the way cli.py runs it."""
+    script_dir, module_name, _ = COMMANDS[(group, command)]
+    sys.path.insert(0, os.path.join(PYTHON_DIR, script_dir))
+    return importlib.import_module(module_name)
+
+
+class _RawBody:
+    """Minimal stand-in for the urllib3 response botocore reads the body from."""
+
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def install_faults(latency, throttle_rate, seed=0):
+    """
+    Delay every request of the shared session and throttle a share of them.
+
+    The handler runs before moto's, so throttled requests never reach the stand-in
+    and go through botocore's retries and the scripts' rate limiters like real ones.
+    """
+    from botocore.awsrequest import AWSResponse
+    from common.clients import default_botocore_session, default_session
+
+    session = default_session()
+    protocols = {}
+    for service in SERVICES:
+        model = default_botocore_session().get_service_model(service)
+        protocols[model.service_id.hyphenize()] = model.metadata["protocol"]
+    rng = random.Random(seed)
+
+    def inject(request, event_name, **kwargs):
+        if latency:
+            time.sleep(latency)
+        response = THROTTLE_RESPONSES.get(protocols.get(event_name.split(".")[1]))
+        if response and throttle_rate and rng.random() < throttle_rate:
+            status, body = response
+            return AWSResponse(request.url, status, {}, _RawBody(body.encode("utf-8")))
+
+    session.events.register_first("before-send", inject)
+
+
+def serialize_moto():
+    """
+    Let moto answer one request at a time.
+
+    Its in-memory backends are not thread-safe (e.g. listing S3 versions while
+    another thread deletes some fails inside moto). Injected latency runs before
+    this lock, so the tools' concurrency is still exercised.
+    """
+    from moto.core.botocore_stubber import BotocoreStubber
+
+    lock = threading.Lock()
+    handle = BotocoreStubber.__call__
+
+    def locked(self, *args, **kwargs):
+        with lock:
+            return handle(self, *args, **kwargs)
+
+    BotocoreStubber.__call__ = locked
+
+
+def reset_peak_rss():
+    """Reset the kernel's peak RSS counter of this process where supported (Linux)."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def current_rss_mb():
+    """Return the current RSS of this process (Linux), or the peak so far where it cannot be read."""
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def peak_rss_mb():
+    """Return the peak RSS since reset_peak_rss(), including finished worker processes."""
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    peak_kb = int(line.split()[1])
+    except OSError:
+        pass
+    return max(peak_kb, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+
+
+# Seeders create the synthetic estate in moto and return what the run needs;
+# runners call the tool's own functions and return the number of items processed.
+
+def seed_instances(args):
+    import boto3
+
+    instance_ids = {}
+    for region in REGIONS[:args.regions]:
+        ec2_client = boto3.client("ec2", region_name=region)
+        instance_ids[region] = []
+        for start in range(0, args.instances, 1000):
+            count = min(1000, args.instances - start)
+            response = ec2_client.run_instances(
+                ImageId=AMI_ID, MinCount=count, MaxCount=count, InstanceType="t3.micro",
+                TagSpecifications=[{"ResourceType": "instance", "Tags": [{"Key": "Name", "Value": "bench"}]}]
+            )
+            instance_ids[region].extend(instance["InstanceId"] for instance in response["Instances"])
+    return instance_ids
+
+
+def run_ec2_inventory(args, instance_ids):
+    from common.sessions import AccountSessionPool
+    listec2s = load_tool("inventory", "ec2")
+    listec2s.write_instances(AccountSessionPool([(ACCOUNT_ID, None)]), "instances.csv", False, args.workers)
+    return sum(len(ids) for ids in instance_ids.values())
+
+
+def run_region_resolution(args, instance_ids):
+    from common.region_index import resolve_instance_regions
+    all_ids = [instance_id for ids in instance_ids.values() for instance_id in ids]
+    resolved = resolve_instance_regions(all_ids, REGIONS[:args.regions], cache_file=None, max_workers=args.workers)
+    return len(resolved)
+
+
+def seed_databases(args):
+    import boto3
+
+    for region in REGIONS[:args.regions]:
+        rds_client = boto3.client("rds", region_name=region)
+        for i in range(args.databases):
+            rds_client.create_db_instance(
+                DBInstanceIdentifier=f"bench-db-{i}", DBInstanceClass="db.t3.micro", Engine="postgres",
+                AllocatedStorage=20, MasterUsername="bench", MasterUserPassword="benchmark-password"
+            )
+    return args.regions * args.databases
+
+
+def run_rds_inventory(args, databases):
+    from common.sessions import AccountSessionPool
+    listRDSdbs = load_tool("inventory", "rds")
+    listRDSdbs.write_rds(AccountSessionPool([(ACCOUNT_ID, None)]), "rds.csv", False, args.workers)
+    return databases
+
+
+def seed_versions(args):
+    """Write args.versions object versions (two per key) spread over S3_PREFIXES prefixes."""
+    import boto3
+
+    s3_client = boto3.client("s3")
+    s3_client.create_bucket(Bucket=BUCKET)
+    s3_client.put_bucket_versioning(Bucket=BUCKET, VersioningConfiguration={"Status": "Enabled"})
+    keys = args.versions // 2
+    for version in range(2):
+        for i in range(keys):
+            s3_client.put_object(Bucket=BUCKET, Key=f"bench/p{i % S3_PREFIXES:02d}/object-{i}", Body=b"x" * (version + 1))
+
+    with open("prefixes.txt", "w") as file:
+        file.writelines(f"bench/p{i:02d}/\n" for i in range(S3_PREFIXES))
+    return keys
+
+
+def run_s3_count(args, keys):
+    countBucket = load_tool("s3", "count")
+    totals = countBucket.count_bucket(BUCKET, "bench/", max_workers=args.workers)
+    return sum(count for count, _ in totals.totals.values())
+
+
+def run_s3_delete(args, keys):
+    deleteOrgBuckets = load_tool("s3", "delete")
+    deleteOrgBuckets.delete_objects_from_file(BUCKET, "prefixes.txt", checkpoint_file="checkpoint.db")
+    return keys * 2
+
+
+def seed_log_files(args):
+    """Write gzipped CloudTrail log files with a small share of ModifyVolume records."""
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    os.makedirs("cloudtrail", exist_ok=True)
+    for file_index in range(args.log_files):
+        records = []
+        for i in range(args.records_per_file):
+            event_time = start + timedelta(seconds=file_index * args.records_per_file + i)
+            modify = rng.random() < MODIFY_VOLUME_SHARE
+            records.append({
+                "eventID": f"{file_index}-{i}",
+                "eventTime": event_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "eventName": "ModifyVolume" if modify else "DescribeInstances",
+                "awsRegion": REGIONS[i % len(REGIONS)],
+                "requestParameters": {"ModifyVolumeRequest": {"VolumeId": f"vol-{i % 500:017x}", "Size": 100}}
+                if modify else {"instancesSet": {}},
+                "responseElements": {"ModifyVolumeResponse": {"volumeModification": {
+                    "volumeId": f"vol-{i % 500:017x}", "originalSize": 50, "targetSize": 100}}} if modify else None
+            })
+        with gzip.open(os.path.join("cloudtrail", f"log-{file_index:06d}.json.gz"), "wt") as file:
+            json.dump({"Records": records}, file)
+    return args.log_files * args.records_per_file
+
+
+def run_ebs_logs(args, records):
+    checkEBSchanges = load_tool("ebs", "changes")
+    checkEBSchanges.analyze_log_files("cloudtrail", args.processes,
+                                      datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2025, 1, 1, tzinfo=timezone.utc))
+    return records
+
+
+def seed_alarm_targets(args):
+    """Return {region: [instance_id, ...]}; alarms only need the IDs, not running instances."""
+    return {
+        region: [f"i-{index:017x}" for index in range(args.alarms)]
+        for region in REGIONS[:args.regions]
+    }
+
+
+def run_alarms(args, instances_by_region):
+    create_alarms = load_tool("alarms", "create")
+    provisioned = create_alarms.provision_alarms(instances_by_region, args.workers)
+    return len(provisioned)
+
+
+def seed_rule_records(args):
+    create_alarms = load_tool("alarms", "create")
+    return [
+        {"alarm_name": f"bench-alarm-{index}", "instance_id": f"i-{index:017x}", "region": region,
+         "event_pattern": create_alarms.event_pattern(f"bench-alarm-{index}")}
+        for region in REGIONS[:args.regions]
+        for index in range(args.alarms)
+    ]
+
+
+def run_rules(args, records):
+    createEventBridgeRule = load_tool("rules", "create")
+    createEventBridgeRule.create_rules(records, args.workers)
+    return len(records)
+
+
+# Benchmark name -> (seeder, runner)
+BENCHMARKS = {
+    "ec2-inventory": (seed_instances, run_ec2_inventory),
+    "region-resolution": (seed_instances, run_region_resolution),
+    "rds-inventory": (seed_databases, run_rds_inventory),
+    "s3-count": (seed_versions, run_s3_count),
+    "s3-delete": (seed_versions, run_s3_delete),
+    "ebs-logs": (seed_log_files, run_ebs_logs),
+    "alarms": (seed_alarm_targets, run_alarms),
+    "rules": (seed_rule_records, run_rules),
+}
+
+
+def run_benchmark(name, args, results):
+    """Seed and run one benchmark in this (child) process and put its result row on the queue."""
+    from moto import mock_aws
+    from common import throttling
+
+    seed, run = BENCHMARKS[name]
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    os.chdir(workdir)
+
+    serialize_moto()
+    with mock_aws():
+        seeded_at = time.perf_counter()
+        state = seed(args)
+        print(f"[{name}] Seeded in {time.perf_counter() - seeded_at:.1f}s; running in {workdir}")
+
+        # Faults are installed after seeding so that only the tool pays for them
+        install_faults(args.latency_ms / 1000, args.throttle_rate)
+        # The seeded moto state dominates the process size, so the tool is judged
+        # by how far it grows the process past this point
+        reset_peak_rss()
+        seeded_rss = current_rss_mb()
+        start = time.perf_counter()
+        items = run(args, state)
+        elapsed = time.perf_counter() - start
+
+    with throttling.stats.lock:
+        counters = list(throttling.stats.counters.values())
+    results.put({
+        "Benchmark": name,
+        "Items": items,
+        "Wall s": round(elapsed, 3),
+        "Items/s": round(items / elapsed if elapsed else 0, 1),
+        "Calls": sum(counter["calls"] for counter in counters),
+        "Retries": sum(counter["retries"] for counter in counters),
+        "Throttles": sum(counter["throttles"] for counter in counters),
+        "Peak RSS MB": round(peak_rss_mb(), 1),
+        "RSS growth MB": round(max(0.0, peak_rss_mb() - seeded_rss), 1),
+        "Latency ms": args.latency_ms,
+        "Throttle rate": args.throttle_rate,
+    })
+
+
+def print_results(rows):
+    print(f"\n{'Benchmark':<20} {'Items':>9} {'Wall s':>9} {'Items/s':>10} {'Calls':>8} "
+          f"{'Retries':>8} {'Throttles':>10} {'Peak RSS MB':>12} {'RSS growth MB':>14}")
+    for row in rows:
+        print(f"{row['Benchmark']:<20} {row['Items']:>9} {row['Wall s']:>9.2f} {row['Items/s']:>10.1f} "
+              f"{row['Calls']:>8} {row['Retries']:>8} {row['Throttles']:>10} {row['Peak RSS MB']:>12.1f} "
+              f"{row['RSS growth MB']:>14.1f}")
+
+
+def compare_with_baseline(rows, baseline_file):
+    """Return the regressions in API calls or RSS growth against a results file saved with --save."""
+    with open(baseline_file, "r") as file:
+        baseline = {row["Benchmark"]: row for row in json.load(file)}
+
+    regressions = []
+    for row in rows:
+        previous = baseline.get(row["Benchmark"])
+        if not previous or any(previous[field] != row[field] for field in ("Items", "Latency ms", "Throttle rate")):
+            continue  # Only runs over the same estate with the same injected faults are comparable
+        for field in ("Calls", "RSS growth MB"):
+            if field in previous and row[field] > previous[field] * (1 + REGRESSION_TOLERANCE):
+                regressions.append(f"{row['Benchmark']}: {field} {previous[field]} -> {row[field]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the scripts against synthetic estates in moto and report wall time, API calls, RSS and throughput."
+    )
+    parser.add_argument("benchmarks", nargs="*", metavar="BENCHMARK",
+                        help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--regions", type=int, default=4, help=f"Regions seeded (at most {len(REGIONS)})")
+    parser.add_argument("--instances", type=int, default=250, help="EC2 instances per region")
+    parser.add_argument("--databases", type=int, default=10, help="RDS instances per region")
+    parser.add_argument("--versions", type=int, default=4000, help="S3 object versions (two per key)")
+    parser.add_argument("--log-files", type=int, default=200, help="CloudTrail log files")
+    parser.add_argument("--records-per-file", type=int, default=500, help="Records per CloudTrail log file")
+    parser.add_argument("--alarms", type=int, default=100, help="Alarms and rules per region")
+    parser.add_argument("--workers", type=int, default=10, help="Worker threads passed to the tools")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="Processes for the log analysis")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added to every API request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of API requests answered with a throttle")
+    parser.add_argument("--save", help="Write the results to a JSON file")
+    parser.add_argument("--baseline", help="Fail if API calls or RSS growth increased over a file written with --save")
+    args = parser.parse_args(argv)
+    args.regions = min(args.regions, len(REGIONS))
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    try:
+        import moto  # noqa: F401
+    except ImportError:
+        print("moto is required to run the benchmarks (pip install moto).")
+        sys.exit(1)
+
+    # The stand-in needs credentials and a region, and must never reach a real account
+    os.environ.update(AWS_ACCESS_KEY_ID="testing", AWS_SECRET_ACCESS_KEY="testing", AWS_SESSION_TOKEN="testing",
+                      AWS_DEFAULT_REGION="us-east-1")
+    os.environ.pop("AWS_PROFILE", None)
+
+    # Each benchmark runs in a fresh process, so clients, counters and peak RSS start from zero
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    rows = []
+    for name in args.benchmarks or BENCHMARKS:
+        process = context.Process(target=run_benchmark, args=(name, args, results))
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"[{name}] Benchmark failed with exit code {process.exitcode}")
+            continue
+        rows.append(results.get())
+
+    print_results(rows)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(rows, file, indent=2)
+        print(f"Results saved to {args.save}")
+    if args.baseline:
+        regressions = compare_with_baseline(rows, args.baseline)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client, set_max_pool_connections
+from common.throttling import print_api_summary
+
+# Input file containing the list of bucket names
+BUCKET_FILE = "buckets.csv"
+# Output file to save the results (tab-separated, like check_buckets.sh)
+OUTPUT_FILE = "bucket_check_results.csv"
+FIELDNAMES = ["Bucket Name", "Exists", "Region", "PublicAccessBlock", "Encryption", "Versioning", "Action"]
+
+# Configuration applied with --apply-block
+PUBLIC_ACCESS_BLOCK = {
+    "BlockPublicAcls": True,
+    "IgnorePublicAcls": True,
+    "BlockPublicPolicy": True,
+    "RestrictPublicBuckets": True
+}
+MAX_WORKERS = 32  # Buckets checked at the same time
+
+
+def bucket_region(s3_client, bucket):
+    """
+    Return (exists, region) using a single head_bucket call.
+
+    S3 reports the bucket region in a header even when access is denied or the
+    request went to the wrong region, so no get_bucket_location is needed.
+    """
+    try:
+        response = s3_client.head_bucket(Bucket=bucket)
+        headers = response["ResponseMetadata"]["HTTPHeaders"]
+        return True, headers.get("x-amz-bucket-region") or s3_client.meta.region_name
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchBucket"):
+            return False, None
+        headers = e.response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+        return True, headers.get("x-amz-bucket-region")
+
+
+def public_access_block(s3_client, bucket):
+    try:
+        return s3_client.get_public_access_block(Bucket=bucket)["PublicAccessBlockConfiguration"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "NoSuchPublicAccessBlockConfiguration":
+            return {}
+        raise
+
+
+def encryption(s3_client, bucket):
+    try:
+        rules = s3_client.get_bucket_encryption(Bucket=bucket)["ServerSideEncryptionConfiguration"]["Rules"]
+        return ",".join(rule["ApplyServerSideEncryptionByDefault"]["SSEAlgorithm"] for rule in rules)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ServerSideEncryptionConfigurationNotFoundError":
+            return "None"
+        raise
+
+
+def check_bucket(bucket, apply_block=False):
+    """Return the result row of a bucket, blocking public access first if requested and needed."""
+    exists, region = bucket_region(get_client("s3"), bucket)
+    row = {"Bucket Name": bucket, "Exists": str(exists), "Region": region or "N/A",
+           "PublicAccessBlock": "N/A", "Encryption": "N/A", "Versioning": "N/A", "Action": "None"}
+    if not exists or not region:
+        return row
+
+    s3_client = get_client("s3", region)
+    block = public_access_block(s3_client, bucket)
+    if apply_block and block != PUBLIC_ACCESS_BLOCK:
+        # Only buckets whose configuration differs are written to
+        s3_client.put_public_access_block(Bucket=bucket, PublicAccessBlockConfiguration=PUBLIC_ACCESS_BLOCK)
+        row["Action"] = "Blocked public access"
+        block = PUBLIC_ACCESS_BLOCK
+
+    row["PublicAccessBlock"] = "Full" if block == PUBLIC_ACCESS_BLOCK else ",".join(
+        key for key, value in sorted(block.items()) if value) or "None"
+    row["Encryption"] = encryption(s3_client, bucket)
+    row["Versioning"] = s3_client.get_bucket_versioning(Bucket=bucket).get("Status", "Disabled")
+    return row
+
+
+def read_buckets(args):
+    if args.all:
+        return [bucket["Name"] for bucket in get_client("s3").list_buckets()["Buckets"]]
+
+    if not os.path.isfile(args.file):
+        print(f"Bucket file not found: {args.file}")
+        sys.exit(1)
+    with open(args.file, "r") as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check existence and public access, encryption and versioning state of S3 buckets.")
+    parser.add_argument("--file", default=BUCKET_FILE, help="File with one bucket name per line")
+    parser.add_argument("--all", action="store_true", help="Check every bucket of the account instead")
+    parser.add_argument("--apply-block", action="store_true", help="Block all public access where it is not fully blocked")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Tab-separated results file")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Buckets checked at the same time")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    # Every worker shares one S3 client per region
+    set_max_pool_connections(args.workers)
+    buckets = read_buckets(args)
+
+    rows = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(check_bucket, bucket, args.apply_block): bucket for bucket in buckets}
+        for future in as_completed(futures):
+            bucket = futures[future]
+            try:
+                rows[bucket] = future.result()
+            except Exception as e:
+                print(f"Error checking bucket {bucket}: {e}")
+                rows[bucket] = {"Bucket Name": bucket, "Exists": "Error", "Action": "None"}
+
+    with open(args.output, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=FIELDNAMES, delimiter="\t", restval="N/A")
+        writer.writeheader()
+        for bucket in buckets:
+            writer.writerow(rows[bucket])
+
+    missing = sum(row["Exists"] == "False" for row in rows.values())
+    blocked = sum(row["Action"] != "None" for row in rows.values())
+    print(f"Checked {len(buckets)} buckets in {time.perf_counter() - start:.2f}s: "
+          f"{missing} missing, public access blocked on {blocked}.")
+    print(f"Results written to {args.output}")
+    print_api_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,182 +1,475 @@
-import boto3
+import argparse
+import codecs
 import csv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import gzip
 import json
+import os
+import re
+import sqlite3
+import sys
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import clients, instrumentation
+from common.clients import default_session, get_client
+from common.throttling import print_api_summary
 
 # Output files
 output_csv_file = "volume_modifications.csv"
 raw_events_file = "modify_volume_events.txt"  # New file to store raw events
+events_db_file = "modify_volume_events.db"     # Local event store used by --incremental
+
+# CloudTrail can deliver events a few minutes late, so incremental runs re-read this much
+# before the last watermark (duplicates are dropped by EventId)
+WATERMARK_OVERLAP = timedelta(minutes=15)
+
+# Windows are split into slices fetched concurrently; every region's calls share
+# one rate limiter held to the 2 TPS LookupEvents quota
+SLICE_SIZE = timedelta(hours=6)
+MAX_WORKERS = 8
+
+# Worker processes used to decompress and parse CloudTrail log files (--logs)
+LOG_PROCESSES = os.cpu_count()
+LOG_CHUNK_SIZE = 1024 * 1024  # Decompressed bytes read from a log file at a time
 
 # Date range for filtering (update as needed)
 start_date = "2024-11-28T00:00:00Z"  # Start of date range (ISO 8601 format)
 end_date = "2024-11-30T23:59:59Z"    # End of date range (ISO 8601 format)
 
 # Convert date range to datetime objects
-start_date_dt = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%SZ")
-end_date_dt = datetime.strptime(end_date, "%Y-%m-%dT%H:%M:%SZ")
+start_date_dt = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+end_date_dt = datetime.strptime(end_date, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
 
-# AWS Regions (update or fetch dynamically)
+# AWS Regions (update, pass --regions, or leave empty to use every EC2 region)
 specific_regions = ["us-east-1"]
-aws_regions = specific_regions if specific_regions else boto3.Session().get_available_regions("ec2")
-
-
-# def parse_modify_volume_event(event):
-#     """Extract volume modification details from a ModifyVolume event."""
-#     try:
-#         volume_id = event["requestParameters"]["ModifyVolumeRequest"]["VolumeId"]
-#         original_size = event["responseElements"]["ModifyVolumeResponse"]["volumeModification"]["originalSize"]
-#         target_size = event["responseElements"]["ModifyVolumeResponse"]["volumeModification"]["targetSize"]
-#         region = event["awsRegion"]
-#         event_time = event["eventTime"]
-#         return {
-#             "Volume ID": volume_id,
-#             "Original Size (GiB)": original_size,
-#             "Target Size (GiB)": target_size,
-#             "Region": region,
-#             "Event Time": event_time
-#         }
-#     except KeyError as e:
-#         print(f"KeyError while parsing event: {e}")
-#         return None
-
-
-# def consolidate_volume_changes(results):
-#     """Consolidate all size changes for each volume into a single entry."""
-#     consolidated = {}
-#     for entry in results:
-#         volume_id = entry["Volume ID"]
-#         size_change = entry["Target Size (GiB)"] - entry["Original Size (GiB)"]
-
-#         if volume_id not in consolidated:
-#             consolidated[volume_id] = {
-#                 "Volume ID": volume_id,
-#                 "Region": entry["Region"],
-#                 "Total Size Increase (GiB)": size_change,
-#                 "Modification Count": 1,
-#                 "Event Times": [entry["Event Time"]]
-#             }
-#         else:
-#             consolidated[volume_id]["Total Size Increase (GiB)"] += size_change
-#             consolidated[volume_id]["Modification Count"] += 1
-#             consolidated[volume_id]["Event Times"].append(entry["Event Time"])
+
+
+def format_time(dt):
+    """Format a datetime as the UTC ISO 8601 string used by the event store."""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_time(value):
+    """Parse an ISO 8601 UTC timestamp such as 2024-11-28T00:00:00Z."""
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+class EventStore:
+    """
+    SQLite store of ModifyVolume events keyed by EventId, with a high-water mark per region.
+
+    The watermark is the end of the last window fetched for a region, so the
+    next incremental run only asks CloudTrail for what came after it.
+    """
+
+    def __init__(self, path=events_db_file):
+        self.conn = sqlite3.connect(path)
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                " event_id TEXT PRIMARY KEY, region TEXT, event_time TEXT, event TEXT)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS events_time ON events (event_time)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS watermarks (region TEXT PRIMARY KEY, fetched_until TEXT)")
+
+    def add_events(self, region, events):
+        """Store (event_id, event_time, cloudtrail_event) tuples; return how many were new."""
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?)",
+                [(event_id, region, format_time(event_time), json.dumps(event)) for event_id, event_time, event in events]
+            )
+            return self.conn.total_changes - before
+
+    def watermark(self, region):
+        row = self.conn.execute("SELECT fetched_until FROM watermarks WHERE region = ?", (region,)).fetchone()
+        return datetime.strptime(row[0], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc) if row else None
+
+    def set_watermark(self, region, fetched_until):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO watermarks VALUES (?, ?)", (region, format_time(fetched_until)))
+
+    def events_between(self, start, end, regions):
+        """Yield the stored CloudTrail events of the given regions with start <= eventTime <= end."""
+        placeholders = ", ".join("?" for _ in regions)
+        rows = self.conn.execute(
+            f"SELECT event FROM events WHERE event_time BETWEEN ? AND ? AND region IN ({placeholders}) ORDER BY event_time",
+            (format_time(start), format_time(end), *regions)
+        )
+        for (event,) in rows:
+            yield json.loads(event)
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_modify_volume_event(event):
+    """Extract volume modification details from a ModifyVolume event."""
+    try:
+        volume_id = event["requestParameters"]["ModifyVolumeRequest"]["VolumeId"]
+        original_size = event["responseElements"]["ModifyVolumeResponse"]["volumeModification"]["originalSize"]
+        target_size = event["responseElements"]["ModifyVolumeResponse"]["volumeModification"]["targetSize"]
+        region = event["awsRegion"]
+        event_time = event["eventTime"]
+        return {
+            "Volume ID": volume_id,
+            "Original Size (GiB)": original_size,
+            "Target Size (GiB)": target_size,
+            "Region": region,
+            "Event Time": event_time
+        }
+    except KeyError as e:
+        print(f"KeyError while parsing event: {e}")
+        return None
+
+
+def consolidate_volume_changes(results):
+    """Consolidate all size changes for each volume into a single entry."""
+    consolidated = {}
+    for entry in results:
+        volume_id = entry["Volume ID"]
+        size_change = entry["Target Size (GiB)"] - entry["Original Size (GiB)"]
+
+        if volume_id not in consolidated:
+            consolidated[volume_id] = {
+                "Volume ID": volume_id,
+                "Region": entry["Region"],
+                "Total Size Increase (GiB)": size_change,
+                "Modification Count": 1,
+                "Event Times": [entry["Event Time"]]
+            }
+        else:
+            consolidated[volume_id]["Total Size Increase (GiB)"] += size_change
+            consolidated[volume_id]["Modification Count"] += 1
+            consolidated[volume_id]["Event Times"].append(entry["Event Time"])
     
-#     return [
-#         {
-#             "Volume ID": v["Volume ID"],
-#             "Region": v["Region"],
-#             "Total Size Increase (GiB)": v["Total Size Increase (GiB)"],
-#             "Modification Count": v["Modification Count"],
-#             "Event Times": ", ".join(v["Event Times"])
-#         }
-#         for v in consolidated.values()
-#     ]
-
-
-def fetch_modify_volume_events_for_region(region):
-    """Fetch ModifyVolume events for a specific region."""
-    cloudtrail_client = boto3.client("cloudtrail", region_name=region)
-    next_token = None
+    return [
+        {
+            "Volume ID": v["Volume ID"],
+            "Region": v["Region"],
+            "Total Size Increase (GiB)": v["Total Size Increase (GiB)"],
+            "Modification Count": v["Modification Count"],
+            "Event Times": ", ".join(v["Event Times"])
+        }
+        for v in consolidated.values()
+    ]
+
+
+def fetch_modify_volume_events_for_region(region, start_time=start_date_dt, end_time=end_date_dt, cloudtrail_client=None):
+    """
+    Fetch ModifyVolume events for a specific region.
+
+    The EventName filter runs server-side, so only matching events are paged through.
+
+    :return: List of (event_id, event_time, cloudtrail_event) tuples, or None if the lookup failed.
+    """
+    # Throttled calls are retried with jittered backoff by the client itself
+    cloudtrail_client = cloudtrail_client or get_client("cloudtrail", region)
+    paginator = cloudtrail_client.get_paginator("lookup_events")
     results = []
 
-    print(f"Fetching ModifyVolume events for region: {region}...")
-    retries = 0
-    max_retries = 5
+    try:
+        pages = paginator.paginate(
+            LookupAttributes=[{"AttributeKey": "EventName", "AttributeValue": "ModifyVolume"}],
+            StartTime=start_time,
+            EndTime=end_time
+        )
+        for page in pages:
+            for event in page["Events"]:
+                try:
+                    cloudtrail_event = json.loads(event["CloudTrailEvent"])
+                    results.append((event["EventId"], event["EventTime"], cloudtrail_event))
+                except json.JSONDecodeError as e:
+                    print(f"JSONDecodeError in region {region}: {e}")
+
+    except Exception as e:
+        print(f"Error while fetching events for region {region} ({format_time(start_time)} - {format_time(end_time)}): {e}")
+        return None
+
+    return results
+
+
+def time_slices(start_time, end_time, slice_size=SLICE_SIZE):
+    """Split [start_time, end_time] into consecutive windows of at most slice_size."""
+    while start_time < end_time:
+        slice_end = min(start_time + slice_size, end_time)
+        yield start_time, slice_end
+        start_time = slice_end
+
+
+def fetch_modify_volume_events(windows, slice_size=SLICE_SIZE, max_workers=MAX_WORKERS):
+    """
+    Fetch several regions' windows as time slices running in parallel.
+
+    :param windows: Dictionary {region: (start_time, end_time)}.
+    :return: Dictionary {region: {event_id: (event_time, cloudtrail_event)}}; the value
+             is None for regions where any slice failed.
+    """
+    clients = {region: get_client("cloudtrail", region) for region in windows}
+    results = {region: {} for region in windows}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for region, (start_time, end_time) in windows.items():
+            print(f"Fetching ModifyVolume events for region: {region} ({format_time(start_time)} - {format_time(end_time)})...")
+            for slice_start, slice_end in time_slices(start_time, end_time, slice_size):
+                future = executor.submit(fetch_modify_volume_events_for_region, region, slice_start, slice_end, clients[region])
+                futures[future] = region
+
+        for future in as_completed(futures):
+            region = futures[future]
+            events = future.result()
+            if events is None:
+                results[region] = None
+            elif results[region] is not None:
+                # Slices share their boundary second, so merge by EventId
+                for event_id, event_time, cloudtrail_event in events:
+                    results[region][event_id] = (event_time, cloudtrail_event)
 
-    while True:
-        try:
-            if next_token:
-                response = cloudtrail_client.lookup_events(
-                    StartTime=start_date_dt,
-                    EndTime=end_date_dt,
-                    NextToken=next_token
-                )
-            else:
-                response = cloudtrail_client.lookup_events(
-                    StartTime=start_date_dt,
-                    EndTime=end_date_dt
-                )
-            
-            # Process each event
-            for event in response["Events"]:
-                if event["EventName"] == "ModifyVolume":
-                    try:
-                        cloudtrail_event = json.loads(event["CloudTrailEvent"])
-                        
-                        # Write raw event to file
-                        with open(raw_events_file, "a") as file:
-                            file.write(json.dumps(cloudtrail_event) + "\n")
-                        
-                        # Parse and store structured data
-                        modification_details = parse_modify_volume_event(cloudtrail_event)
-                        if modification_details:
-                            results.append(modification_details)
-                    except json.JSONDecodeError as e:
-                        print(f"JSONDecodeError in region {region}: {e}")
-            
-            next_token = response.get("NextToken")
-            if not next_token:
-                break
-        
-        except boto3.exceptions.Boto3Error as e:
-            print(f"Error while fetching events for region {region}: {e}")
-            retries += 1
-            if retries > max_retries:
-                print(f"Exceeded max retries for region {region}. Skipping.")
-                break
-            time.sleep(2 ** retries)  # Exponential backoff
-
-        except Exception as e:
-            print(f"Unexpected error while fetching events for region {region}: {e}")
-            break
-    
     return results
 
 
-# def write_to_csv(filename, data):
-#     """Write data to a CSV file."""
-#     try:
-#         with open(filename, "w", newline="") as file:
-#             csv_writer = csv.DictWriter(file, fieldnames=[
-#                 "Volume ID",
-#                 "Region",
-#                 "Total Size Increase (GiB)",
-#                 "Modification Count",
-#                 "Event Times"
-#             ])
-#             csv_writer.writeheader()
-#             csv_writer.writerows(data)
-#         print(f"Output successfully written to {filename}.")
-#     except Exception as e:
-#         print(f"Error writing to CSV: {e}")
-
-
-def main():
+def write_to_csv(filename, data):
+    """Write data to a CSV file."""
+    try:
+        with open(filename, "w", newline="") as file:
+            csv_writer = csv.DictWriter(file, fieldnames=[
+                "Volume ID",
+                "Region",
+                "Total Size Increase (GiB)",
+                "Modification Count",
+                "Event Times"
+            ])
+            csv_writer.writeheader()
+            csv_writer.writerows(data)
+        print(f"Output successfully written to {filename}.")
+    except Exception as e:
+        print(f"Error writing to CSV: {e}")
+
+
+def list_log_files(source):
+    """Return the CloudTrail log files under a local directory or an s3://bucket/prefix URL."""
+    suffixes = (".json.gz", ".json")
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://"):].partition("/")
+        paginator = get_client("s3").get_paginator("list_objects_v2")
+        return [
+            f"s3://{bucket}/{obj['Key']}"
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+            for obj in page.get("Contents", [])
+            if obj["Key"].endswith(suffixes)
+        ]
+
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(source)
+        for name in names
+        if name.endswith(suffixes)
+    )
+
+
+def open_log_file(path):
+    """Open a local or S3 log file as a binary stream, decompressing .gz files on the fly."""
+    if path.startswith("s3://"):
+        bucket, _, key = path[len("s3://"):].partition("/")
+        stream = get_client("s3").get_object(Bucket=bucket, Key=key)["Body"]
+    else:
+        stream = open(path, "rb")
+    return gzip.open(stream) if path.endswith(".gz") else stream
+
+
+def stream_contains(stream, needle, chunk_size=LOG_CHUNK_SIZE):
+    """Return True if needle occurs in the rest of a binary stream, reading it chunk by chunk."""
+    tail = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return False
+        # The needle may straddle two chunks
+        if needle in chunk or needle in tail + chunk[:len(needle) - 1]:
+            return True
+        tail = chunk[-(len(needle) - 1):]
+
+
+_separator = re.compile(r"[\s,]*")
+
+
+def iter_records(stream, chunk_size=LOG_CHUNK_SIZE):
+    """Decode the entries of a log file's "Records" array one at a time, reading the stream in chunks."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    text = ""
+    pos = None  # Offset of the next record once the array has been found
+    eof = False
+    while True:
+        if pos is None:
+            records_key = text.find('"Records"')
+            bracket = text.find("[", records_key) if records_key >= 0 else -1
+            if bracket >= 0:
+                pos = bracket + 1
+        if pos is not None:
+            pos = _separator.match(text, pos).end()
+            if pos < len(text):
+                if text[pos] == "]":
+                    return
+                try:
+                    record, end = decoder.raw_decode(text, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # The record continues in the next chunk
+                else:
+                    pos = end
+                    yield record
+                    continue
+        if eof:
+            return
+
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        text = text[pos or 0:] + utf8.decode(chunk, final=eof)
+        pos = 0 if pos is not None else None
+
+
+def init_log_worker():
+    """Start a log worker process without the clients and recorder it inherited from the parent."""
+    # Only the parent records API calls; a forked recorder would write to the parent's trace file
+    instrumentation.disable()
+    # Forked clients would share the parent's pooled connections
+    clients.clear()
+
+
+def extract_modify_volume_records(path, start=start_date, end=end_date, regions=None):
+    """
+    Return the ModifyVolume records of one log file with start <= eventTime <= end.
+
+    Files that do not mention ModifyVolume at all (nearly all of them) are skipped
+    after a streamed byte search, without being parsed; the others are opened
+    again and parsed record by record, so no file is ever held in memory whole.
+
+    :param regions: Only keep records whose awsRegion is in this collection (None keeps all).
+    """
+    try:
+        with open_log_file(path) as stream:
+            if not stream_contains(stream, b'"ModifyVolume"'):
+                return []
+        with open_log_file(path) as stream:
+            return [
+                record for record in iter_records(stream)
+                if record.get("eventName") == "ModifyVolume" and start <= record.get("eventTime", "") <= end
+                and (regions is None or record.get("awsRegion") in regions)
+            ]
+    except Exception as e:
+        print(f"Error reading log file {path}: {e}")
+        return []
+
+
+def analyze_log_files(source, processes=LOG_PROCESSES, start_time=start_date_dt, end_time=end_date_dt, regions=None):
+    """
+    Collect ModifyVolume records from CloudTrail log files with a process pool.
+
+    :param source: Local directory or s3://bucket/prefix holding the trail's log files.
+    :param regions: Regions whose records are kept (None keeps every region).
+    :return: List of CloudTrail records, de-duplicated by eventID.
+    """
+    paths = list_log_files(source)
+    print(f"Analyzing {len(paths)} CloudTrail log files from {source}...")
+
+    start = time.perf_counter()
+    events = {}
+    worker = partial(extract_modify_volume_records, start=format_time(start_time), end=format_time(end_time),
+                     regions=set(regions) if regions else None)
+    with ProcessPoolExecutor(max_workers=processes, initializer=init_log_worker) as executor:
+        for records in executor.map(worker, paths, chunksize=16):
+            for record in records:
+                events[record["eventID"]] = record
+
+    elapsed = time.perf_counter() - start
+    print(f"Parsed {len(paths)} files in {elapsed:.1f}s ({len(paths) / elapsed if elapsed else 0:.0f} files/s), "
+          f"{len(events)} ModifyVolume events found.")
+    return list(events.values())
+
+
+def fetch_from_lookup_events(incremental, regions, start_time=start_date_dt, end_time=end_date_dt):
+    """Fetch new events with lookup_events into the store and return the report window's events."""
+    store = EventStore()
+    report_end = datetime.now(timezone.utc) if incremental else end_time
+    fetched_events = []
+
+    windows = {}
+    for region in regions:
+        fetch_start = start_time
+        if incremental:
+            watermark = store.watermark(region)
+            if watermark:
+                fetch_start = max(start_time, watermark - WATERMARK_OVERLAP)
+        windows[region] = (fetch_start, report_end)
+
+    for region, region_events in fetch_modify_volume_events(windows).items():
+        if region_events is None:
+            continue  # Keep the old watermark so the window is fetched again next time
+
+        new_events = store.add_events(
+            region,
+            [(event_id, event_time, event) for event_id, (event_time, event) in region_events.items()]
+        )
+        fetched_events.extend(event for _, event in region_events.values())
+        if incremental:
+            store.set_watermark(region, report_end)
+        print(f"{region}: {len(region_events)} events fetched, {new_events} new")
+
+    events = list(store.events_between(start_time, report_end, regions))
+    store.close()
+    return fetched_events, events
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report EBS ModifyVolume changes recorded by CloudTrail.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--incremental", action="store_true",
+                        help="Only fetch events newer than each region's last watermark and report up to now")
+    source.add_argument("--logs", metavar="SOURCE",
+                        help="Read CloudTrail log files from a local directory or s3://bucket/prefix instead of lookup_events")
+    parser.add_argument("--processes", type=int, default=LOG_PROCESSES, help="Worker processes for --logs")
+    parser.add_argument("--start", type=parse_time, default=start_date_dt, help=f"Start of the date range (default: {start_date})")
+    parser.add_argument("--end", type=parse_time, default=end_date_dt, help=f"End of the date range (default: {end_date})")
+    parser.add_argument("--regions", nargs="+", default=specific_regions, help="Regions to query, or to keep records of with --logs (default: specific_regions)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
+
     print("Starting script...")
+    if args.logs:
+        fetched_events = events = analyze_log_files(args.logs, args.processes, args.start, args.end, args.regions)
+    else:
+        regions = args.regions or default_session().get_available_regions("ec2")
+        fetched_events, events = fetch_from_lookup_events(args.incremental, regions, args.start, args.end)
 
-    # Clear the raw events file before writing
+    # Write the raw events fetched in this run in a single pass
     with open(raw_events_file, "w") as file:
-        file.write("")  # Empty the file
+        file.writelines(json.dumps(event) + "\n" for event in fetched_events)
 
     all_results = []
+    for event in events:
+        modification_details = parse_modify_volume_event(event)
+        if modification_details:
+            all_results.append(modification_details)
 
-    # Process each region
-    for region in aws_regions:
-        print(f"Processing region: {region}")
-        region_results = fetch_modify_volume_events_for_region(region)
-        all_results.extend(region_results)
+    if all_results:
+        # Consolidate results
+        print("Consolidating volume changes...")
+        consolidated_results = consolidate_volume_changes(all_results)
 
-    if not all_results:
+        # Write to CSV
+        print(f"Writing consolidated results to {output_csv_file}...")
+        write_to_csv(output_csv_file, consolidated_results)
+    else:
         print("No events found in the specified date range.")
-        return
-
-    # Consolidate results
-    print("Consolidating volume changes...")
-    consolidated_results = consolidate_volume_changes(all_results)
-
-    # Write to CSV
-    print(f"Writing consolidated results to {output_csv_file}...")
-    write_to_csv(output_csv_file, consolidated_results)
+    print_api_summary()
 
 
 if __name__ == "__main__":
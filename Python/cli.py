@@ -0,0 +1,54 @@
+import argparse
+import importlib
+import os
+import sys
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (group, command) -> (script directory, module, description)
+COMMANDS = {
+    ("inventory", "ec2"): ("listInstances", "listec2s", "List EC2 instances of one account or an organization"),
+    ("inventory", "rds"): ("listRDSdbs", "listRDSdbs", "List RDS instances and clusters"),
+    ("inventory", "sg"): ("GetSecGroups", "securityGroupsInfo", "Export the security group rules of instances"),
+    ("inventory", "certs"): ("listRDSdbs", "getCertExp", "List RDS instances whose CA certificate expires soon"),
+    ("s3", "delete"): ("OrgS3Del", "deleteOrgBuckets", "Delete every object version under a list of prefixes"),
+    ("s3", "count"): ("CountBucket", "countBucket", "Count the objects and bytes under a prefix"),
+    ("s3", "check"): ("bucketCheck", "check_buckets", "Check bucket existence and public access posture"),
+    ("alarms", "create"): ("createCWAlarms", "create_alarms", "Create CPU alarms and write the alarm manifest"),
+    ("rules", "create"): ("createEBrule", "createEventBridgeRule", "Create EventBridge rules from the alarm manifest"),
+    ("ssm", "rollout"): ("SsmDocs", "create_ssm_docs", "Create or update the SSM document in every region"),
+    ("flowlogs", "enable"): ("VpcFlowLogs", "vpc_flow_logs", "Enable VPC flow logs where they are missing"),
+    ("ebs", "changes"): ("checkEBSchanges", "checkEBSchanges", "Report EBS volume modifications from CloudTrail"),
+    ("tags", "apply"): ("tagEC2s", "tag_instances", "Tag EC2 instances"),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Run the AWS scripts under one entry point; arguments after the command go to the script."
+    )
+    groups = parser.add_subparsers(dest="group", metavar="GROUP", required=True)
+    subparsers = {}
+    for (group, command), (_, _, description) in COMMANDS.items():
+        if group not in subparsers:
+            group_parser = groups.add_parser(group, help=f"{group} commands")
+            subparsers[group] = group_parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+        # Help is left to the script so that "cli.py s3 count --help" shows its own options
+        subparsers[group].add_parser(command, help=description, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    args, script_args = build_parser().parse_known_args(argv)
+    script_dir, module_name, _ = COMMANDS[(args.group, args.command)]
+
+    # Scripts are imported only when run, so listing commands does not load boto3
+    sys.path.insert(0, os.path.join(PYTHON_DIR, script_dir))
+    module = importlib.import_module(module_name)
+    sys.argv[0] = f"{os.path.basename(sys.argv[0])} {args.group} {args.command}"  # Shown in the script's usage line
+    module.main(script_args)
+
+
+if __name__ == "__main__":
+    main()
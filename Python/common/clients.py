@@ -0,0 +1,66 @@
+import threading
+
+from common.throttling import make_client
+
+# Connections per client. botocore's default is 10; clients shared by more
+# threads than that should be sized with set_max_pool_connections() first.
+DEFAULT_POOL_CONNECTIONS = 10
+
+_lock = threading.RLock()
+_clients = {}
+_session = None
+_botocore_session = None
+_max_pool_connections = DEFAULT_POOL_CONNECTIONS
+
+
+def set_max_pool_connections(count):
+    """Size the connection pool of clients created from now on to the caller's concurrency."""
+    global _max_pool_connections
+    with _lock:
+        _max_pool_connections = max(DEFAULT_POOL_CONNECTIONS, count)
+
+
+def default_session():
+    """Return the boto3 session shared by every script, so service models are loaded once."""
+    global _session, _botocore_session
+    with _lock:
+        if _session is None:
+            import boto3  # Imported on first use so --help and argument errors stay fast
+            from botocore.session import get_session
+            _botocore_session = get_session()
+            _session = boto3.Session(botocore_session=_botocore_session)
+        return _session
+
+
+def default_botocore_session():
+    """Return the botocore session under default_session(), e.g. to share its data loader."""
+    default_session()
+    return _botocore_session
+
+
+def get_client(service, region_name=None, session=None):
+    """
+    Return the shared client of a service and region, creating it on first use.
+
+    Clients are thread-safe once built, but boto3 sessions are not, so they are
+    created under a lock and then reused by every worker.
+
+    :param service: Service name, e.g. "ec2".
+    :param region_name: Region of the client (defaults to the session's region).
+    :param session: boto3 session the client belongs to (defaults to default_session()).
+                    Clients are cached per session, so each assumed-role session gets its own.
+    """
+    with _lock:
+        session = session or default_session()
+        key = (session, region_name or session.region_name, service)
+        if key not in _clients:
+            from botocore.config import Config
+            _clients[key] = make_client(service, region_name, session,
+                                        Config(max_pool_connections=_max_pool_connections))
+        return _clients[key]
+
+
+def clear():
+    """Drop every cached client (e.g. between benchmark runs or after a fork)."""
+    with _lock:
+        _clients.clear()
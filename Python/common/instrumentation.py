@@ -0,0 +1,207 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+from common.throttling import THROTTLE_CODES
+
+# Upper bounds (ms) of the latency histogram buckets; slower calls land in an overflow bucket
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Set by enable(). Clients created while it is None get no hooks at all, so
+# instrumentation costs nothing unless --api-stats or --trace is given.
+recorder = None
+
+# Recorder inherited by a forked worker and switched off there by disable()
+_inherited = None
+
+
+class OperationStats:
+    """Counters and latency histogram of one (service, operation, region)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add_latency(self, ms):
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for index, bound in enumerate(LATENCY_BUCKETS_MS):
+            if ms <= bound:
+                self.histogram[index] += 1
+                return
+        self.histogram[-1] += 1
+
+    def percentile(self, fraction):
+        """Return the upper bound of the bucket holding the given fraction of calls (max_ms for the overflow)."""
+        target = fraction * sum(self.histogram)
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return min(LATENCY_BUCKETS_MS[index], self.max_ms) if index < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return 0.0
+
+
+class Recorder:
+    """
+    Per-call statistics collected through botocore event hooks.
+
+    Calls are timed from before-call to after-call, so the latency includes
+    retries and the time spent waiting on the rate limiter.
+    """
+
+    def __init__(self, trace_file=None):
+        self.lock = threading.Lock()
+        self.stats = defaultdict(OperationStats)
+        self.started = time.perf_counter()
+        self.trace = None
+        self.chrome = False
+        if trace_file:
+            # Events are streamed, so tracing long sweeps does not grow memory.
+            # The Chrome trace array format allows the closing bracket to be left out.
+            self.trace = open(trace_file, "w")
+            self.chrome = not trace_file.endswith(".jsonl")
+            if self.chrome:
+                self.trace.write("[\n")
+
+    def attach(self, client):
+        """Register the hooks on one client."""
+        service = client.meta.service_model.service_name
+        region = client.meta.region_name
+
+        def before_call(context, **kwargs):
+            context["instrumentation_start"] = time.perf_counter()
+
+        def before_send(request, event_name, **kwargs):
+            body = request.body
+            if isinstance(body, (bytes, str)):
+                with self.lock:
+                    self.stats[(service, event_name.rsplit(".", 1)[-1], region)].bytes_sent += len(body)
+
+        def needs_retry(response=None, operation=None, **kwargs):
+            if response is not None and response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+                with self.lock:
+                    self.stats[(service, operation.name, region)].throttles += 1
+
+        def after_call(http_response, parsed, model, context, **kwargs):
+            # Streaming bodies (e.g. get_object) have not been read yet, so only their header is used
+            received = http_response.headers.get("content-length")
+            if received is None and not model.has_streaming_output:
+                received = len(http_response.content)
+            status = parsed.get("Error", {}).get("Code", "ok")
+            self.finish(service, model.name, region, context, status,
+                        parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0), int(received or 0))
+
+        def after_call_error(exception, model, context, **kwargs):
+            metadata = getattr(exception, "response", {}).get("ResponseMetadata", {})
+            self.finish(service, model.name, region, context, type(exception).__name__,
+                        metadata.get("RetryAttempts", 0), 0)
+
+        client.meta.events.register("before-call", before_call)
+        client.meta.events.register_first("before-send", before_send)
+        client.meta.events.register("needs-retry", needs_retry)
+        client.meta.events.register("after-call", after_call)
+        client.meta.events.register("after-call-error", after_call_error)
+
+    def finish(self, service, operation, region, context, status, retries, received):
+        end = time.perf_counter()
+        start = context.get("instrumentation_start", end)
+        ms = (end - start) * 1000
+
+        with self.lock:
+            stats = self.stats[(service, operation, region)]
+            stats.calls += 1
+            stats.errors += status != "ok"
+            stats.retries += retries
+            stats.bytes_received += received
+            stats.add_latency(ms)
+            if self.trace:
+                self.write_event(service, operation, region, start, ms, status, retries)
+
+    def write_event(self, service, operation, region, start, ms, status, retries):
+        offset_us = (start - self.started) * 1e6
+        if self.chrome:
+            event = {"name": f"{service}.{operation}", "cat": service, "ph": "X", "ts": round(offset_us),
+                     "dur": round(ms * 1000), "pid": os.getpid(), "tid": threading.get_ident(),
+                     "args": {"region": region, "status": status, "retries": retries}}
+            self.trace.write(json.dumps(event) + ",\n")
+        else:
+            event = {"start_ms": round(offset_us / 1000, 3), "duration_ms": round(ms, 3), "service": service,
+                     "operation": operation, "region": region, "status": status, "retries": retries,
+                     "thread": threading.get_ident()}
+            self.trace.write(json.dumps(event) + "\n")
+
+    def close(self):
+        with self.lock:
+            if self.trace:
+                self.trace.close()
+                self.trace = None
+
+    def print_summary(self):
+        with self.lock:
+            rows = sorted(self.stats.items())
+        rows = [(key, stats) for key, stats in rows if stats.calls]
+        if not rows:
+            return
+
+        print(f"\n{'Service':<12} {'Operation':<32} {'Region':<16} {'Calls':>7} {'Errors':>7} {'Retries':>8} "
+              f"{'Throttles':>10} {'Avg ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'Max ms':>9} {'KB out':>9} {'KB in':>9}")
+        for (service, operation, region), stats in rows:
+            print(f"{service:<12} {operation:<32} {region:<16} {stats.calls:>7} {stats.errors:>7} {stats.retries:>8} "
+                  f"{stats.throttles:>10} {stats.total_ms / stats.calls:>8.1f} {stats.percentile(0.5):>8.1f} "
+                  f"{stats.percentile(0.95):>8.1f} {stats.max_ms:>9.1f} {stats.bytes_sent / 1024:>9.1f} "
+                  f"{stats.bytes_received / 1024:>9.1f}")
+
+
+def enable(trace_file=None):
+    """Instrument every client created from now on and print the summary at exit."""
+    global recorder
+    if recorder is None:
+        active = recorder = Recorder(trace_file)
+
+        def report():
+            active.close()
+            active.print_summary()
+            if trace_file:
+                print(f"API call trace written to {trace_file}")
+
+        atexit.register(report)
+    return recorder
+
+
+def disable():
+    """
+    Stop recording in this process, e.g. in a forked worker that inherited the parent's recorder.
+
+    Clients created from now on get no hooks. The inherited recorder stays
+    referenced so that its trace file, which the parent owns, is never flushed
+    or closed from here.
+    """
+    global recorder, _inherited
+    if recorder is not None:
+        _inherited = recorder
+        recorder = None
+
+
+def add_arguments(parser):
+    """Add --api-stats and --trace to a script's argument parser."""
+    parser.add_argument("--api-stats", action="store_true",
+                        help="Print call counts, latency percentiles, retries and bytes per API operation at exit")
+    parser.add_argument("--trace", metavar="FILE",
+                        help="Write every API call to FILE (.jsonl for JSON lines, otherwise Chrome trace format)")
+
+
+def setup(args):
+    """Enable instrumentation if the script was run with --api-stats or --trace."""
+    if args.api_stats or args.trace:
+        enable(args.trace)
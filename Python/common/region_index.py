@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from common.clients import get_client
+
+# On-disk instance ID -> region index shared by tagEC2s, createCWAlarms and GetSecGroups
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "aws-scripts", "instance_regions.json")
+CACHE_TTL = 24 * 60 * 60  # Seconds before a cached entry is looked up again
+
+# Instance IDs sent per describe_instances filter
+FILTER_CHUNK_SIZE = 200
+
+
+def load_cache(cache_file=CACHE_FILE, ttl=CACHE_TTL):
+    """Return the non-expired {instance_id: region} entries of the cache file."""
+    try:
+        with open(cache_file, "r") as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    now = time.time()
+    return {
+        instance_id: entry["region"]
+        for instance_id, entry in entries.items()
+        if now - entry["seen"] < ttl
+    }
+
+
+def save_cache(regions_by_id, cache_file=CACHE_FILE, ttl=CACHE_TTL):
+    """Merge newly resolved {instance_id: region} entries into the cache file, dropping expired ones."""
+    try:
+        with open(cache_file, "r") as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        entries = {}
+
+    now = time.time()
+    entries = {instance_id: entry for instance_id, entry in entries.items() if now - entry["seen"] < ttl}
+    for instance_id, region in regions_by_id.items():
+        entries[instance_id] = {"region": region, "seen": now}
+
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "w") as file:
+        json.dump(entries, file)
+    os.replace(tmp_file, cache_file)
+
+
+def find_instances_in_region(ec2_client, instance_ids):
+    """
+    Return {instance_id: instance} for the instance_ids that exist in the client's region.
+
+    An instance-id filter (unlike InstanceIds=) does not fail the whole call when
+    some of the IDs live in another region, so IDs are sent in batches.
+    """
+    found = {}
+    paginator = ec2_client.get_paginator("describe_instances")
+    for i in range(0, len(instance_ids), FILTER_CHUNK_SIZE):
+        chunk = instance_ids[i:i + FILTER_CHUNK_SIZE]
+        for page in paginator.paginate(Filters=[{"Name": "instance-id", "Values": chunk}]):
+            for reservation in page["Reservations"]:
+                for instance in reservation["Instances"]:
+                    found[instance["InstanceId"]] = instance
+    return found
+
+
+def _search_regions(ids_by_region, session, max_workers):
+    """Run find_instances_in_region for every {region: [instance_id, ...]}; return {instance_id: (region, instance)}."""
+    found = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(find_instances_in_region, get_client("ec2", region, session), ids): region
+            for region, ids in ids_by_region.items() if ids
+        }
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                for instance_id, instance in future.result().items():
+                    found[instance_id] = (region, instance)
+            except Exception as e:
+                print(f"Error searching for instances in {region}: {e}")
+    return found
+
+
+def describe_instances_by_id(instance_ids, regions, session=None, cache_file=CACHE_FILE, ttl=CACHE_TTL, max_workers=10):
+    """
+    Describe each instance once, wherever it lives, for callers that need more than its region.
+
+    Cached IDs are only looked up in their cached region; the others (and cached
+    ones not found there any more) are searched in every region.
+
+    :return: Dictionary {instance_id: (region, instance)}; IDs not found anywhere are left out.
+    """
+    instance_ids = list(dict.fromkeys(instance_ids))
+    cached = load_cache(cache_file, ttl) if cache_file else {}
+    ids_by_region = {}
+    for instance_id in instance_ids:
+        if cached.get(instance_id) in regions:
+            ids_by_region.setdefault(cached[instance_id], []).append(instance_id)
+    found = _search_regions(ids_by_region, session, max_workers)
+
+    missing = [instance_id for instance_id in instance_ids if instance_id not in found]
+    if missing:
+        searched = _search_regions({region: missing for region in regions}, session, max_workers)
+        found.update(searched)
+        if cache_file and searched:
+            save_cache({instance_id: region for instance_id, (region, _) in searched.items()}, cache_file, ttl)
+    return found
+
+
+def resolve_instance_regions(instance_ids, regions, session=None, cache_file=CACHE_FILE, ttl=CACHE_TTL, max_workers=10):
+    """
+    Find the region of each instance with one batched lookup per region.
+
+    :param instance_ids: Instance IDs to locate.
+    :param regions: List of AWS regions to search.
+    :param session: Optional boto3 session (defaults to the shared one).
+    :param cache_file: JSON cache path, or None to skip the cache.
+    :param ttl: Maximum age in seconds of a cached entry.
+    :param max_workers: Maximum number of regions searched at the same time.
+    :return: Dictionary {instance_id: region}; IDs not found anywhere are left out.
+    """
+    instance_ids = list(dict.fromkeys(instance_ids))
+    cached = load_cache(cache_file, ttl) if cache_file else {}
+    resolved = {instance_id: cached[instance_id] for instance_id in instance_ids if instance_id in cached}
+    missing = [instance_id for instance_id in instance_ids if instance_id not in resolved]
+    if not missing:
+        return resolved
+
+    searched = _search_regions({region: missing for region in regions}, session, max_workers)
+    found = {instance_id: region for instance_id, (region, _) in searched.items()}
+
+    if cache_file and found:
+        save_cache(found, cache_file, ttl)
+
+    resolved.update(found)
+    return resolved
+
+
+def find_instances_by_filters(filters, regions, session=None, cache_file=CACHE_FILE, max_workers=10):
+    """
+    Find instances matching describe_instances filters (e.g. tag:Key) in every region.
+
+    :param filters: describe_instances Filters list.
+    :param regions: List of AWS regions to search.
+    :param cache_file: JSON cache the matches are added to, or None.
+    :return: Dictionary {instance_id: region}.
+    """
+    clients = {region: get_client("ec2", region, session) for region in regions}
+
+    def search(region):
+        paginator = clients[region].get_paginator("describe_instances")
+        return [
+            instance["InstanceId"]
+            for page in paginator.paginate(Filters=filters)
+            for reservation in page["Reservations"]
+            for instance in reservation["Instances"]
+        ]
+
+    found = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(search, region): region for region in regions}
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                for instance_id in future.result():
+                    found[instance_id] = region
+            except Exception as e:
+                print(f"Error searching for instances in {region}: {e}")
+
+    if cache_file and found:
+        save_cache(found, cache_file)
+    return found
+
+
+def parse_tag(value):
+    """argparse type for KEY=VALUE tag arguments; returns (key, value)."""
+    key, separator, tag_value = value.partition('=')
+    if not key or not separator:
+        raise argparse.ArgumentTypeError(f"expected KEY=VALUE, got '{value}'")
+    return key, tag_value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the region of each EC2 instance as 'instance_id region' lines.")
+    parser.add_argument("instance_ids", nargs="*", help="Instance IDs to locate")
+    parser.add_argument("--file", help="File with one instance ID per line")
+    parser.add_argument("--regions", nargs="+", required=True, help="Regions to search")
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not update the on-disk cache")
+    args = parser.parse_args()
+
+    instance_ids = list(args.instance_ids)
+    if args.file:
+        with open(args.file, "r") as file:
+            instance_ids.extend(line.strip() for line in file if line.strip())
+
+    regions_by_id = resolve_instance_regions(instance_ids, args.regions, cache_file=None if args.no_cache else CACHE_FILE)
+    for instance_id in instance_ids:
+        if instance_id in regions_by_id:
+            print(f"{instance_id} {regions_by_id[instance_id]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import threading
+
+from common.clients import default_botocore_session, default_session, get_client
+
+# Role assumed in member accounts when only an account ID is given
+DEFAULT_ROLE_NAME = "OrganizationAccountAccessRole"
+SESSION_NAME = "scripts-org-sweep"
+
+# Column every org-wide inventory puts the account ID in
+ACCOUNT_FIELD = "AccountId"
+
+
+def load_accounts(file_path, role_name=DEFAULT_ROLE_NAME):
+    """
+    Read account IDs or role ARNs, one per line.
+
+    :param file_path: Text file with one account ID or role ARN per line ('#' starts a comment).
+    :param role_name: Role assumed for lines that only contain an account ID.
+    :return: List of (account_id, role_arn) tuples.
+    """
+    accounts = []
+    with open(file_path, "r") as file:
+        for line in file:
+            entry = line.split("#", 1)[0].strip()
+            if not entry:
+                continue
+            if entry.startswith("arn:"):
+                accounts.append((entry.split(":")[4], entry))
+            else:
+                accounts.append((entry, f"arn:aws:iam::{entry}:role/{role_name}"))
+    return accounts
+
+
+class AccountSessionPool:
+    """
+    Assumed-role sessions and clients keyed by account.
+
+    Credentials are fetched on first use and refreshed by botocore before they
+    expire. Clients come from the shared registry in common.clients, so there is
+    one per (account, region, service) and worker threads share them.
+    """
+
+    def __init__(self, accounts, base_session=None, session_name=SESSION_NAME):
+        """
+        :param accounts: List of (account_id, role_arn) tuples; a role_arn of None uses base_session as is.
+        :param base_session: Session used to call STS (defaults to the shared default session).
+        :param session_name: RoleSessionName passed to AssumeRole.
+        """
+        self.base_session = base_session or default_session()
+        self.default_region = self.base_session.region_name or "us-east-1"
+        self.session_name = session_name
+        self.role_arns = dict(accounts)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    @property
+    def account_ids(self):
+        return list(self.role_arns)
+
+    def _assume_role_credentials(self, role_arn):
+        from botocore.credentials import DeferredRefreshableCredentials
+
+        sts_client = get_client("sts", session=self.base_session)
+
+        def refresh():
+            credentials = sts_client.assume_role(
+                RoleArn=role_arn,
+                RoleSessionName=self.session_name
+            )["Credentials"]
+            return {
+                "access_key": credentials["AccessKeyId"],
+                "secret_key": credentials["SecretAccessKey"],
+                "token": credentials["SessionToken"],
+                "expiry_time": credentials["Expiration"].isoformat()
+            }
+
+        return DeferredRefreshableCredentials(refresh_using=refresh, method="sts-assume-role")
+
+    def _role_session(self, role_arn):
+        """Return a boto3 session whose credential chain starts with the assumed role."""
+        import boto3
+        from botocore.credentials import CredentialProvider
+        from botocore.session import get_session
+
+        credentials = self._assume_role_credentials(role_arn)
+
+        class AssumedRoleProvider(CredentialProvider):
+            METHOD = "sts-assume-role"
+            CANONICAL_NAME = "scripts-assume-role"
+
+            def load(self):
+                return credentials
+
+        botocore_session = get_session()
+        botocore_session.get_component("credential_provider").insert_before("env", AssumedRoleProvider())
+        # Reuse the service models already parsed by the shared session
+        botocore_session.register_component("data_loader", default_botocore_session().get_component("data_loader"))
+        return boto3.Session(botocore_session=botocore_session, region_name=self.default_region)
+
+    def session(self, account_id):
+        """Return the (cached) boto3 session for an account."""
+        with self._lock:
+            if account_id not in self._sessions:
+                role_arn = self.role_arns[account_id]
+                if role_arn is None:
+                    session = self.base_session
+                else:
+                    session = self._role_session(role_arn)
+                self._sessions[account_id] = session
+            return self._sessions[account_id]
+
+    def client(self, account_id, service, region=None):
+        """Return the (cached) client for an account, service and region."""
+        return get_client(service, region or self.default_region, self.session(account_id))
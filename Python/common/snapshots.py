@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from common.writers import open_writer
+
+# Local store of inventory runs; delete it to start the history over
+SNAPSHOT_FILE = "inventory_snapshots.db"
+
+# Columns of the change set written after each snapshot run
+CHANGE_FIELDS = ["Change", "Account", "Region", "ResourceId", "Field", "Old", "New"]
+
+
+def record_hash(record):
+    """Return a stable hash of a record's values."""
+    return hashlib.sha1(json.dumps(record, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class SnapshotStore:
+    """
+    SQLite history of inventory runs, one row per (run, account, region, resource ID).
+
+    Each region also keeps the fingerprint it was collected with, so a later run
+    can carry an unchanged region over instead of describing it again.
+    """
+
+    def __init__(self, path=SNAPSHOT_FILE):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                " run_id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, taken_at TEXT, completed INTEGER DEFAULT 0)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                " run_id INTEGER, account TEXT, region TEXT, resource_id TEXT, hash TEXT, data TEXT,"
+                " PRIMARY KEY (run_id, account, region, resource_id))"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS regions ("
+                " run_id INTEGER, account TEXT, region TEXT, fingerprint TEXT,"
+                " PRIMARY KEY (run_id, account, region))"
+            )
+
+    def start_run(self, kind, id_fields):
+        """
+        Start a snapshot of one kind of inventory (e.g. "ec2").
+
+        :param id_fields: Record fields that together identify a resource.
+        """
+        with self.lock, self.conn:
+            previous = self.conn.execute(
+                "SELECT MAX(run_id) FROM runs WHERE kind = ? AND completed = 1", (kind,)
+            ).fetchone()[0]
+            run_id = self.conn.execute(
+                "INSERT INTO runs (kind, taken_at) VALUES (?, ?)",
+                (kind, datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"))
+            ).lastrowid
+        return SnapshotRun(self, run_id, previous, id_fields)
+
+    def close(self):
+        self.conn.close()
+
+
+class SnapshotRun:
+    """One inventory run being recorded, compared with the last completed run of its kind."""
+
+    def __init__(self, store, run_id, previous_run_id, id_fields):
+        self.store = store
+        self.run_id = run_id
+        self.previous_run_id = previous_run_id
+        self.id_fields = id_fields
+        self.carried = 0
+
+    def resource_id(self, record):
+        return ":".join(str(record[field]) for field in self.id_fields)
+
+    def add_records(self, account, region, records):
+        """
+        Store part of a region's records (without account columns), e.g. one page.
+
+        The region only counts as collected once complete_region is called, so a
+        region that fails halfway does not report its unseen resources as removed.
+        """
+        rows = [
+            (self.run_id, account, region, self.resource_id(record), record_hash(record), json.dumps(record, default=str))
+            for record in records
+        ]
+        with self.store.lock, self.store.conn:
+            self.store.conn.executemany("INSERT OR REPLACE INTO resources VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def complete_region(self, account, region, fingerprint=None):
+        """Mark a region whose records were all stored with add_records as collected."""
+        with self.store.lock, self.store.conn:
+            self.store.conn.execute("INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?)",
+                                    (self.run_id, account, region, fingerprint))
+
+    def add_region(self, account, region, records, fingerprint=None):
+        """Store a region's records (without account columns) as collected in this run."""
+        self.add_records(account, region, records)
+        self.complete_region(account, region, fingerprint)
+
+    def previous_fingerprint(self, account, region):
+        if self.previous_run_id is None:
+            return None
+        with self.store.lock:
+            row = self.store.conn.execute(
+                "SELECT fingerprint FROM regions WHERE run_id = ? AND account = ? AND region = ?",
+                (self.previous_run_id, account, region)
+            ).fetchone()
+        return row[0] if row else None
+
+    def carry_over(self, account, region, fingerprint):
+        """Copy a region's records from the previous run into this one and return them."""
+        with self.store.lock, self.store.conn:
+            self.store.conn.execute(
+                "INSERT OR REPLACE INTO resources"
+                " SELECT ?, account, region, resource_id, hash, data FROM resources"
+                " WHERE run_id = ? AND account = ? AND region = ?",
+                (self.run_id, self.previous_run_id, account, region)
+            )
+            self.store.conn.execute("INSERT OR REPLACE INTO regions VALUES (?, ?, ?, ?)",
+                                    (self.run_id, account, region, fingerprint))
+            rows = self.store.conn.execute(
+                "SELECT data FROM resources WHERE run_id = ? AND account = ? AND region = ?",
+                (self.run_id, account, region)
+            ).fetchall()
+            self.carried += 1
+        return [json.loads(data) for data, in rows]
+
+    def finish(self):
+        """Mark the run complete so the next run diffs against it."""
+        with self.store.lock, self.store.conn:
+            self.store.conn.execute("UPDATE runs SET completed = 1 WHERE run_id = ?", (self.run_id,))
+
+    def changes(self):
+        """
+        Yield the change set against the previous run as CHANGE_FIELDS records.
+
+        The previous run is loaded into a dictionary once and every record of this
+        run is looked up in it, so the comparison is a single hash join.
+        """
+        if self.previous_run_id is None:
+            return
+
+        with self.store.lock:
+            previous = {
+                (account, region, resource_id): (hash_, data)
+                for account, region, resource_id, hash_, data in self.store.conn.execute(
+                    "SELECT account, region, resource_id, hash, data FROM resources WHERE run_id = ?",
+                    (self.previous_run_id,)
+                )
+            }
+            current = self.store.conn.execute(
+                "SELECT account, region, resource_id, hash, data FROM resources WHERE run_id = ?",
+                (self.run_id,)
+            ).fetchall()
+            collected = set(self.store.conn.execute(
+                "SELECT account, region FROM regions WHERE run_id = ?", (self.run_id,)
+            ).fetchall())
+
+        for account, region, resource_id, hash_, data in current:
+            if (account, region) not in collected:
+                continue  # Partly collected before the region failed
+            old = previous.pop((account, region, resource_id), None)
+            if old is None:
+                yield {"Change": "added", "Account": account, "Region": region, "ResourceId": resource_id,
+                       "Field": "", "Old": "", "New": ""}
+            elif old[0] != hash_:
+                old_record, new_record = json.loads(old[1]), json.loads(data)
+                for field in sorted(new_record.keys() | old_record.keys()):
+                    if old_record.get(field) != new_record.get(field):
+                        yield {"Change": "modified", "Account": account, "Region": region, "ResourceId": resource_id,
+                               "Field": field, "Old": old_record.get(field, ""), "New": new_record.get(field, "")}
+
+        # Regions that failed in this run are left out rather than reported as emptied
+        for account, region, resource_id in previous:
+            if (account, region) not in collected:
+                continue
+            yield {"Change": "removed", "Account": account, "Region": region, "ResourceId": resource_id,
+                   "Field": "", "Old": "", "New": ""}
+
+
+def changes_path(output_file):
+    """Return the change-set file written next to an inventory file."""
+    base, extension = os.path.splitext(output_file)
+    return f"{base}_changes{extension}"
+
+
+def finish_and_report(run, output_file, fmt=None):
+    """Complete a snapshot run, write its change set and print a summary."""
+    run.finish()
+    if run.previous_run_id is None:
+        print("First snapshot recorded; changes are reported from the next run on.")
+        return
+
+    counts = {"added": 0, "removed": 0, "modified": 0}
+    path = changes_path(output_file)
+    with open_writer(path, CHANGE_FIELDS, fmt) as writer:
+        for change in run.changes():
+            counts[change["Change"]] += 1
+            writer.write(change)
+
+    carried = f", {run.carried} unchanged regions carried over" if run.carried else ""
+    print(f"Changes since the previous snapshot: {counts['added']} added, {counts['removed']} removed, "
+          f"{counts['modified']} field changes{carried}. Written to {path}.")
@@ -0,0 +1,54 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def enabled_regions(ec2_client):
+    """Return the regions enabled for the client's account."""
+    return [region["RegionName"] for region in ec2_client.describe_regions()["Regions"]]
+
+
+def sweep(pool, service, collect, max_workers=10, with_account=False):
+    """
+    Run a per-region collector for every account and region in a session pool.
+
+    Regions are discovered per account (opt-in regions differ between accounts),
+    then the whole account x region matrix runs on one thread pool.
+
+    :param pool: AccountSessionPool with the accounts to scan.
+    :param service: Service name of the client handed to the collector.
+    :param collect: Callable (client, region) -> list of rows.
+    :param max_workers: Maximum number of concurrent API streams.
+    :param with_account: Call collect(client, region, account_id) instead.
+    :return: Generator of (account_id, region, rows, elapsed seconds) as each pair finishes.
+    """
+    def list_regions(account_id):
+        return enabled_regions(pool.client(account_id, "ec2"))
+
+    def run(account_id, region):
+        start = time.perf_counter()
+        client = pool.client(account_id, service, region)
+        rows = collect(client, region, account_id) if with_account else collect(client, region)
+        return rows, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        region_futures = {executor.submit(list_regions, account_id): account_id for account_id in pool.account_ids}
+
+        futures = {}
+        for future in as_completed(region_futures):
+            account_id = region_futures[future]
+            try:
+                regions = future.result()
+            except Exception as e:
+                print(f"Could not list regions for account {account_id}: {e}")
+                continue
+            for region in regions:
+                futures[executor.submit(run, account_id, region)] = (account_id, region)
+
+        for future in as_completed(futures):
+            account_id, region = futures[future]
+            try:
+                rows, elapsed = future.result()
+            except Exception as e:
+                print(f"Could not scan {service} in account {account_id}, region {region}: {e}")
+                continue
+            yield account_id, region, rows, elapsed
@@ -0,0 +1,213 @@
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+# Error codes that mean "slow down" across the services used by these scripts
+THROTTLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "SlowDown",
+    "RateExceeded",
+    "PriorRequestNotComplete",
+}
+
+# Starting request rate (calls/s) per service; anything else starts at DEFAULT_RATE
+INITIAL_RATES = {
+    "cloudtrail": 2.0,  # LookupEvents is limited to 2 TPS per region
+    # S3 scales per prefix (3,500 writes/s each, a 1000-key delete_objects counting
+    # as 1000), so the request rate is bounded by SlowDown responses, not a fixed TPS
+    "s3": 100.0,
+}
+DEFAULT_RATE = 20.0
+MIN_RATE = 0.5
+MAX_RATE = 200.0
+
+# Hard ceilings for services with a documented per-region quota
+MAX_RATES = {
+    "cloudtrail": 2.0,
+}
+
+# Attempts per call, including the first one; backoff between them is botocore's
+# "standard" mode (exponential with full jitter)
+MAX_ATTEMPTS = 8
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate follows AIMD.
+
+    Every successful call raises the rate by about one call/s per second of
+    successes; every throttling response halves it.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a call may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + 1.0 / self.rate)
+
+    def on_throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+class ApiStats:
+    """Thread-safe call/retry/throttle counters per (service, region)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: {"calls": 0, "errors": 0, "retries": 0, "throttles": 0})
+
+    def add(self, service, region, **counts):
+        with self.lock:
+            counters = self.counters[(service, region)]
+            for name, value in counts.items():
+                counters[name] += value
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+_client_limiters = weakref.WeakKeyDictionary()
+stats = ApiStats()
+
+
+def set_rate(service, rate=None, max_rate=None):
+    """Override the starting rate and/or ceiling of a service for limiters created from now on."""
+    with _limiters_lock:
+        if rate is not None:
+            INITIAL_RATES[service] = rate
+        if max_rate is not None:
+            MAX_RATES[service] = max_rate
+
+
+def get_limiter(service, region, session=None):
+    """
+    Return the limiter shared by every client of a service in a region.
+
+    Quotas are per account, so each session (one per account in an org sweep)
+    gets its own limiters and one throttled account does not slow the others.
+    """
+    with _limiters_lock:
+        key = (session, service, region)
+        if key not in _limiters:
+            _limiters[key] = AdaptiveRateLimiter(
+                INITIAL_RATES.get(service, DEFAULT_RATE),
+                max_rate=MAX_RATES.get(service, MAX_RATE)
+            )
+        return _limiters[key]
+
+
+def _error_code(response):
+    if response is None:
+        return None
+    return response[1].get("Error", {}).get("Code")
+
+
+def make_client(service, region_name=None, session=None, config=None):
+    """
+    Create a boto3 client that waits on the shared limiter and adapts it to throttling.
+
+    :param service: Service name, e.g. "ec2".
+    :param region_name: Region of the client (defaults to the session's region).
+    :param session: Optional boto3 session (defaults to the global one).
+    :param config: Optional botocore Config merged over the retry settings.
+    """
+    # Imported here so that importing the common package does not load boto3
+    import boto3
+    from botocore.config import Config
+
+    retry_config = Config(retries={"mode": "standard", "max_attempts": MAX_ATTEMPTS})
+    config = retry_config.merge(config) if config else retry_config
+    client = (session or boto3).client(service, region_name=region_name, config=config)
+
+    region = client.meta.region_name
+    limiter = get_limiter(service, region, session)
+    _client_limiters[client] = limiter
+
+    def before_send(**kwargs):
+        limiter.acquire()
+
+    def needs_retry(response=None, **kwargs):
+        if _error_code(response) in THROTTLE_CODES:
+            limiter.on_throttle()
+            stats.add(service, region, throttles=1)
+
+    def after_call(parsed, **kwargs):
+        # Error responses also end up here; only real successes raise the rate
+        failed = "Error" in parsed
+        if not failed:
+            limiter.on_success()
+        stats.add(service, region, calls=1, errors=int(failed),
+                  retries=parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+
+    def after_call_error(exception=None, **kwargs):
+        # Raised before any response was parsed (e.g. connection errors)
+        metadata = getattr(exception, "response", {}).get("ResponseMetadata", {})
+        stats.add(service, region, calls=1, errors=1, retries=metadata.get("RetryAttempts", 0))
+
+    # First, so the limiter also runs ahead of handlers that answer the request themselves (moto, Stubber)
+    client.meta.events.register_first("before-send", before_send)
+    client.meta.events.register("needs-retry", needs_retry)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call_error)
+
+    from common import instrumentation  # Imported here as it imports this module
+    if instrumentation.recorder:
+        instrumentation.recorder.attach(client)
+    return client
+
+
+def note_throttle(client):
+    """Report a throttle returned inside a successful response (e.g. per-key SlowDown errors)."""
+    service = client.meta.service_model.service_name
+    region = client.meta.region_name
+    (_client_limiters.get(client) or get_limiter(service, region)).on_throttle()
+    stats.add(service, region, throttles=1)
+
+
+def lowest_rate(service, region):
+    """Return the current rate of the most throttled account's limiter for a service and region."""
+    with _limiters_lock:
+        rates = [limiter.rate for (_, name, limiter_region), limiter in _limiters.items()
+                 if name == service and limiter_region == region]
+    return min(rates) if rates else INITIAL_RATES.get(service, DEFAULT_RATE)
+
+
+def print_api_summary():
+    """Print the call, retry and throttle counters collected during the run."""
+    with stats.lock:
+        rows = sorted(stats.counters.items())
+    if not rows:
+        return
+
+    print(f"{'Service':<12} {'Region':<16} {'Calls':>7} {'Errors':>7} {'Retries':>8} {'Throttles':>10} {'Rate/s':>8}")
+    for (service, region), counters in rows:
+        rate = lowest_rate(service, region)
+        print(f"{service:<12} {region:<16} {counters['calls']:>7} {counters['errors']:>7} "
+              f"{counters['retries']:>8} {counters['throttles']:>10} {rate:>8.1f}")
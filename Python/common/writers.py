@@ -0,0 +1,128 @@
+import csv
+import json
+import os
+import sys
+
+# Output formats, chosen with --format or from the file extension
+FORMATS = ("csv", "jsonl", "parquet")
+
+# Rows buffered per Parquet row group; the other formats write every record immediately
+PARQUET_BATCH_ROWS = 10000
+
+
+class CsvWriter:
+    def __init__(self, path, fieldnames):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, restval="N/A")
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(record)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path, fieldnames):
+        self.file = open(path, "w")
+        self.fieldnames = fieldnames
+
+    def write(self, record):
+        # Datetimes and other non-JSON values are written as strings
+        self.file.write(json.dumps({name: record.get(name, "N/A") for name in self.fieldnames}, default=str) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """
+    Writes records in row groups of PARQUET_BATCH_ROWS.
+
+    Every column is stored as a string so that the schema does not depend on
+    which values the first batch happened to contain.
+    """
+
+    def __init__(self, path, fieldnames):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            print("pyarrow is required to write Parquet output (pip install pyarrow).")
+            sys.exit(1)
+
+        self.pa = pa
+        self.fieldnames = fieldnames
+        self.schema = pa.schema([(name, pa.string()) for name in fieldnames])
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.columns = {name: [] for name in fieldnames}
+        self.rows = 0
+
+    def write(self, record):
+        for name in self.fieldnames:
+            value = record.get(name, "N/A")
+            self.columns[name].append(None if value is None else str(value))
+        self.rows += 1
+        if self.rows >= PARQUET_BATCH_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.table(self.columns, schema=self.schema))
+            self.columns = {name: [] for name in self.fieldnames}
+            self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def output_format(path, fmt=None):
+    """Return the format to write: fmt if given, else the path's extension, else csv."""
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    return extension if extension in WRITERS else "csv"
+
+
+def output_path(path, fmt):
+    """Replace the extension of a default output path with the format's."""
+    return f"{os.path.splitext(path)[0]}.{fmt}" if fmt else path
+
+
+class RecordWriter:
+    """Context manager streaming dict records to one of the WRITERS, counting them."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.count = 0
+
+    def write(self, record):
+        self.writer.write(record)
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.writer.close()
+
+
+def open_writer(path, fieldnames, fmt=None):
+    """
+    Open a RecordWriter for CSV, JSONL or Parquet output.
+
+    :param path: Output file.
+    :param fieldnames: Columns, in output order; missing values are written as "N/A".
+    :param fmt: One of FORMATS, or None to use the path's extension.
+    """
+    return RecordWriter(WRITERS[output_format(path, fmt)](path, fieldnames))
@@ -1,5 +1,14 @@
-import boto3
+import argparse
 import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import instrumentation
+from common.clients import get_client
+from common.region_index import find_instances_by_filters, parse_tag, resolve_instance_regions
+from common.throttling import print_api_summary
 
 # Configuration
 ALARM_NAME_PREFIX = "CPUTheadDump"
@@ -9,82 +18,175 @@ THRESHOLD = 85.0  # Threshold percentage
 PERIOD = 300
 EVALUATION_PERIODS = 2
 STATISTIC = "Average"
-OUTPUT_FILE = "alarm_event_patterns.txt"
+COMPARISON_OPERATOR = "GreaterThanThreshold"
+OUTPUT_FILE = "alarm_manifest.jsonl"  # One JSON record per alarm, read by createEventBridgeRule.py
 INSTANCE_IDS = [
     'i-0cbc3471f59b7ea6d',
     'i-014c4ecddbad6b7c9'
 
 ]
 REGIONS = ["us-east-1", "us-west-2", "us-east-2", "us-west-1", "eu-central-1", "ca-central-1"]
+MAX_WORKERS = 10  # Concurrent put_metric_alarm calls
 
 
-def find_instance_region(instance_id):
+def alarm_definition(instance_id):
     """
-    Find the region where the instance is located by querying all specified regions.
+    Return the put_metric_alarm parameters for an instance.
     """
-    for region in REGIONS:
-        print(f"Searching for {instance_id} in region {region}...")
-        ec2_client = boto3.client("ec2", region_name=region)
-        try:
-            response = ec2_client.describe_instances(InstanceIds=[instance_id])
-            if response["Reservations"]:
-                return region
-        except ec2_client.exceptions.ClientError as e:
-            if "InvalidInstanceID" not in str(e):
-                print(f"Error searching for instance in {region}: {e}")
-    return None
-
-
-def create_alarm(instance_id, region):
+    return {
+        "AlarmName": f"{ALARM_NAME_PREFIX}_{instance_id}",
+        "Namespace": NAMESPACE,
+        "MetricName": METRIC_NAME,
+        "Dimensions": [{"Name": "InstanceId", "Value": instance_id}],
+        "Statistic": STATISTIC,
+        "Period": PERIOD,
+        "EvaluationPeriods": EVALUATION_PERIODS,
+        "Threshold": THRESHOLD,
+        "ComparisonOperator": COMPARISON_OPERATOR,
+        "AlarmDescription": f"High {METRIC_NAME} alarm for instance {instance_id}"
+    }
+
+
+def existing_alarms(cw_client):
     """
-    Create a CloudWatch alarm and save the event pattern to the output file.
+    Return every alarm of the region whose name starts with ALARM_NAME_PREFIX, keyed by name.
     """
-    alarm_name = f"{ALARM_NAME_PREFIX}_{instance_id}"
-    cw_client = boto3.client("cloudwatch", region_name=region)
+    paginator = cw_client.get_paginator("describe_alarms")
+    return {
+        alarm["AlarmName"]: alarm
+        for page in paginator.paginate(AlarmNamePrefix=ALARM_NAME_PREFIX, AlarmTypes=["MetricAlarm"])
+        for alarm in page["MetricAlarms"]
+    }
 
-    # Create the CloudWatch alarm
-    cw_client.put_metric_alarm(
-        AlarmName=alarm_name,
-        Namespace=NAMESPACE,
-        MetricName=METRIC_NAME,
-        Dimensions=[{"Name": "InstanceId", "Value": instance_id}],
-        Statistic=STATISTIC,
-        Period=PERIOD,
-        EvaluationPeriods=EVALUATION_PERIODS,
-        Threshold=THRESHOLD,
-        ComparisonOperator="GreaterThanThreshold",
-        AlarmDescription=f"High {METRIC_NAME} alarm for instance {instance_id}"
-    )
-    print(f"Created alarm for instance {instance_id} with name {alarm_name} in region {region}")
-
-    # Generate event pattern
-    event_pattern = {
+
+def event_pattern(alarm_name):
+    """
+    Return the EventBridge pattern matching state changes of an alarm.
+    """
+    return {
         "source": ["aws.cloudwatch"],
         "detail-type": ["CloudWatch Alarm State Change"],
         "detail": {"alarmName": [alarm_name]}
     }
 
-    # Write to output file
-    with open(OUTPUT_FILE, "a") as f:
-        f.write(f"Alarm created: {alarm_name} in region {region}\n")
-        f.write(json.dumps(event_pattern, indent=2))
-        f.write("\n\n")
 
+def create_alarm(cw_client, instance_id, region, existing=None):
+    """
+    Create or update the CloudWatch alarm of an instance unless an identical one exists.
+
+    :param existing: The alarm's current describe_alarms entry, if any.
+    :return: "created", "updated" or "unchanged".
+    """
+    definition = alarm_definition(instance_id)
+    alarm_name = definition["AlarmName"]
+
+    if existing and all(existing.get(key) == value for key, value in definition.items()):
+        print(f"Alarm {alarm_name} in region {region} is up to date. Skipping...")
+        return "unchanged"
+
+    # Create the CloudWatch alarm
+    cw_client.put_metric_alarm(**definition)
+    action = "updated" if existing else "created"
+    print(f"{action.capitalize()} alarm for instance {instance_id} with name {alarm_name} in region {region}")
+    return action
+
+
+def provision_alarms(instances_by_region, max_workers=MAX_WORKERS):
+    """
+    Provision the alarms of every region concurrently.
+
+    :param instances_by_region: Dictionary {region: [instance_id, ...]}.
+    :return: List of (alarm_name, instance_id, region) for every alarm that now exists.
+    """
+    provisioned = []
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # One paginated describe_alarms per region instead of one lookup per alarm, all regions at once
+        listings = {executor.submit(existing_alarms, get_client("cloudwatch", region)): region
+                    for region in instances_by_region}
+        futures = {}
+        for listing in as_completed(listings):
+            region = listings[listing]
+            cw_client = get_client("cloudwatch", region)
+            try:
+                alarms = listing.result()
+            except Exception as e:
+                print(f"Could not list existing alarms in region {region}: {e}")
+                alarms = {}
+
+            for instance_id in instances_by_region[region]:
+                existing = alarms.get(alarm_definition(instance_id)["AlarmName"])
+                future = executor.submit(create_alarm, cw_client, instance_id, region, existing)
+                futures[future] = (instance_id, region)
+
+        for future in as_completed(futures):
+            instance_id, region = futures[future]
+            try:
+                counts[future.result()] += 1
+                provisioned.append((alarm_definition(instance_id)["AlarmName"], instance_id, region))
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Failed to create alarm for instance {instance_id} in region {region}: {e}")
+
+    print(f"Alarms created: {counts['created']}, updated: {counts['updated']}, "
+          f"unchanged: {counts['unchanged']}, failed: {counts['failed']}")
+    return sorted(provisioned)
+
+
+def write_manifest(provisioned):
+    """
+    Write one JSON line per alarm (name, instance, region, event pattern) to OUTPUT_FILE in one buffered write.
+    """
+    records = [
+        json.dumps({
+            "alarm_name": alarm_name,
+            "instance_id": instance_id,
+            "region": region,
+            "event_pattern": event_pattern(alarm_name)
+        }) + "\n"
+        for alarm_name, instance_id, region in provisioned
+    ]
 
-def main():
-    # Clear the output file
     with open(OUTPUT_FILE, "w") as f:
-        pass
+        f.write("".join(records))
+
 
-    # Process each instance ID
-    for instance_id in INSTANCE_IDS:
-        region = find_instance_region(instance_id)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create CPU alarms for EC2 instances.")
+    parser.add_argument("--ids-file", help="File with one instance ID per line (defaults to INSTANCE_IDS)")
+    parser.add_argument("--tag", type=parse_tag, metavar="KEY=VALUE", help="Select every instance carrying this tag instead")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Concurrent put_metric_alarm calls")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
+
+    if args.tag:
+        key, value = args.tag
+        instance_regions = find_instances_by_filters([{"Name": f"tag:{key}", "Values": [value]}], REGIONS)
+        instance_ids = sorted(instance_regions)
+    else:
+        instance_ids = INSTANCE_IDS
+        if args.ids_file:
+            with open(args.ids_file, "r") as f:
+                instance_ids = [line.strip() for line in f if line.strip()]
+
+        # Resolve every instance's region in one batched pass
+        instance_regions = resolve_instance_regions(instance_ids, REGIONS)
+
+    instances_by_region = {}
+    for instance_id in instance_ids:
+        region = instance_regions.get(instance_id)
         if not region:
             print(f"Instance {instance_id} not found in any region. Skipping...")
             continue
-        create_alarm(instance_id, region)
+        instances_by_region.setdefault(region, []).append(instance_id)
+
+    provisioned = provision_alarms(instances_by_region, args.workers)
+    write_manifest(provisioned)
 
-    print(f"All alarms created. Event patterns saved to {OUTPUT_FILE}.")
+    print(f"All alarms created. Alarm manifest saved to {OUTPUT_FILE}.")
+    print_api_summary()
 
 
 if __name__ == "__main__":
@@ -1,97 +1,135 @@
-import boto3
-import re
+import argparse
 import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Input file containing the event patterns and other configurations
-INPUT_FILE = "alarm_event_patterns.txt"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import instrumentation
+from common.clients import get_client
+from common.throttling import print_api_summary
+
+# Alarm manifest written by createCWAlarms/create_alarms.py (one JSON record per line)
+INPUT_FILE = "alarm_manifest.jsonl"
 
 # AWS configuration
 ACCOUNT_ID = "261140574810"  # Replace with your AWS account ID
 SSM_DOCUMENT_NAME = "vault-thread-dumps-dev"  # Replace with your SSM Document name
 EVENTBRIDGE_RULE_ROLE = "arn:aws:iam::261140574810:role/Eventbridge_SSM_Permissions"
+MAX_WORKERS = 10  # Rules created at the same time
+
 
-with open(INPUT_FILE, "r") as file:
-    event_pattern = ""
-    brace_count = 0  # Counter to track JSON completeness
-    region = None
-    alarm_name = ""
-    instance_id = ""
-
-    for line in file:
-        # Check if the line indicates alarm creation with region info
-        if line.startswith("Alarm created:"):
-            # Extract alarm name, instance ID, and region using more robust regex
-            alarm_name_match = re.search(r'CPUTheadDump_[^\s]+', line)
-            instance_id_match = re.search(r'i-[0-9a-fA-F]+', line)
-            region_match = re.search(r'(?<=region )\S+$', line.strip())
-
-            # Validate and assign extracted information
-            if alarm_name_match and instance_id_match and region_match:
-                alarm_name = alarm_name_match.group(0)
-                instance_id = instance_id_match.group(0)
-                region = region_match.group(0)
-                rule_name = f"{alarm_name}_rule"
-                print(f"Creating EventBridge rule '{rule_name}' in region {region} for instance {instance_id}...")
-            else:
-                print(f"Could not parse alarm details from line: {line}")
+def read_manifest(file_path):
+    """
+    Stream the alarm records of a manifest file, skipping lines that are not valid records.
+    """
+    with open(file_path, "r") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
                 continue
+            try:
+                record = json.loads(line)
+                if all(key in record for key in ("alarm_name", "instance_id", "region", "event_pattern")):
+                    yield record
+                    continue
+            except json.JSONDecodeError:
+                pass
+            print(f"Could not parse alarm record on line {line_number}: {line.strip()}")
+
+
+def rule_target(region, instance_id):
+    """
+    Return the SSM Run Command target executed on the instance when its rule fires.
+    """
+    return {
+        "Id": "1",
+        "Arn": f"arn:aws:ssm:{region}:{ACCOUNT_ID}:document/{SSM_DOCUMENT_NAME}",
+        "RoleArn": EVENTBRIDGE_RULE_ROLE,
+        "RunCommandParameters": {
+            "RunCommandTargets": [
+                {
+                    "Key": "InstanceIds",
+                    "Values": [instance_id]
+                }
+            ]
+        }
+    }
+
+
+def ensure_rule(client, record):
+    """
+    Create or update the rule and target of an alarm unless identical ones already exist.
+
+    :return: "created", "updated" or "unchanged".
+    """
+    alarm_name = record["alarm_name"]
+    instance_id = record["instance_id"]
+    region = record["region"]
+    rule_name = f"{alarm_name}_rule"
+    description = f"Event rule for alarm {alarm_name} targeting instance {instance_id}"
+    target = rule_target(region, instance_id)
 
-        # Accumulate the lines for the JSON event pattern
-        if "{" in line:
-            brace_count += line.count("{")  # Increment for every opening brace
-        if "}" in line:
-            brace_count -= line.count("}")  # Decrement for every closing brace
+    try:
+        rule = client.describe_rule(Name=rule_name)
+    except client.exceptions.ResourceNotFoundException:
+        rule = None
 
-        # Only add lines that are part of the JSON
-        if brace_count > 0 or "}" in line:
-            event_pattern += line.strip()
+    changed = False
+    if not rule or json.loads(rule.get("EventPattern", "{}")) != record["event_pattern"] or rule.get("Description") != description:
+        client.put_rule(
+            Name=rule_name,
+            EventPattern=json.dumps(record["event_pattern"]),
+            Description=description
+        )
+        changed = True
 
-        # Check if the JSON is complete (all braces balanced)
-        if brace_count == 0 and event_pattern.strip():
+    targets = client.list_targets_by_rule(Rule=rule_name)["Targets"] if rule else []
+    if [{key: existing.get(key) for key in target} for existing in targets] != [target]:
+        # Attach the target to the EventBridge rule
+        client.put_targets(Rule=rule_name, Targets=[target])
+        changed = True
+
+    if not changed:
+        return "unchanged"
+    print(f"Successfully {'updated' if rule else 'created'} EventBridge rule '{rule_name}' with target in region {region} for instance {instance_id}.")
+    return "updated" if rule else "created"
+
+
+def create_rules(records, max_workers=MAX_WORKERS):
+    """
+    Create the rules of every manifest record concurrently, with one shared events client per region.
+    """
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for record in records:
+            client = get_client("events", record["region"])
+            futures[executor.submit(ensure_rule, client, record)] = record
+
+        for future in as_completed(futures):
+            record = futures[future]
             try:
-                # Validate the event pattern
-                event_pattern_json = json.loads(event_pattern)
-
-                # Create EventBridge client in the appropriate region
-                client = boto3.client("events", region_name=region)
-
-                # Create the EventBridge rule
-                rule_arn = client.put_rule(
-                    Name=rule_name,
-                    EventPattern=json.dumps(event_pattern_json),  # Use validated JSON
-                    Description=f"Event rule for alarm {alarm_name} targeting instance {instance_id}"
-                )["RuleArn"]
-
-                # Define the target for SSM document execution with role and instance ID
-                target_arn = f"arn:aws:ssm:{region}:{ACCOUNT_ID}:document/{SSM_DOCUMENT_NAME}"
-                target = {
-                    "Id": "1",
-                    "Arn": target_arn,
-                    "RoleArn": EVENTBRIDGE_RULE_ROLE,
-                    "RunCommandParameters": {
-                        "RunCommandTargets": [
-                            {
-                                "Key": "InstanceIds",
-                                "Values": [instance_id]
-                            }
-                        ]
-                    }
-                }
+                counts[future.result()] += 1
+            except Exception as e:
+                counts["failed"] += 1
+                print(f"Error creating rule or setting target for alarm '{record['alarm_name']}' in region {record['region']}: {e}")
+
+    print(f"Rules created: {counts['created']}, updated: {counts['updated']}, "
+          f"unchanged: {counts['unchanged']}, failed: {counts['failed']}")
+
 
-                # Attach the target to the EventBridge rule
-                client.put_targets(Rule=rule_name, Targets=[target])
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create EventBridge rules running the SSM document when alarms fire.")
+    parser.add_argument("--input", default=INPUT_FILE, help="Alarm manifest written by create_alarms.py")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Rules created at the same time")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
 
-                print(f"Successfully created EventBridge rule '{rule_name}' with target in region {region} for instance {instance_id}.")
+    create_rules(read_manifest(args.input), args.workers)
+    print_api_summary()
 
-            except json.JSONDecodeError as json_error:
-                print(f"Invalid JSON event pattern for alarm '{alarm_name}': {event_pattern}")
-                print(f"Error: {json_error}")
-            except boto3.exceptions.Boto3Error as boto3_error:
-                print(f"Error creating rule or setting target: {boto3_error}")
 
-            # Reset the pattern and region after creating each rule
-            event_pattern = ""
-            brace_count = 0
-            region = None
-            alarm_name = ""
-            instance_id = ""
+if __name__ == "__main__":
+    main()
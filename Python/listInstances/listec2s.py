@@ -1,17 +1,208 @@
-import boto3
-import csv
+import argparse
+import hashlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import instrumentation
+from common.clients import default_session, get_client
+from common.sessions import ACCOUNT_FIELD, AccountSessionPool, DEFAULT_ROLE_NAME, load_accounts
+from common.snapshots import SNAPSHOT_FILE, SnapshotStore, finish_and_report
+from common.sweep import sweep
+from common.throttling import print_api_summary
+from common.writers import FORMATS, open_writer, output_path
+
+# CSV columns, in output order
+FIELDNAMES = ['Region', 'Instance ID', 'Instance Name', 'Instance Type', 'State', 'Public IP', 'Private IP', 'Launch Time']
+
+# Maximum number of regions scanned at the same time (1 = sequential)
+MAX_WORKERS = 10
+
+# Instances per describe_instances page (the API maximum)
+PAGE_SIZE = 1000
+
+# Pages buffered between the region scans and the writer; scans wait when it is full
+PAGE_QUEUE_SIZE = 32
+
+# Values accepted by --state
+INSTANCE_STATES = ['pending', 'running', 'shutting-down', 'terminated', 'stopping', 'stopped']
+
 def get_instance_name(instance):
     # Finds Name Tags
-    for tag in instance.tags or []:
+    for tag in instance.get('Tags') or ():
         if tag['Key'] == 'Name':
             return tag['Value']
     return 'N/A'  # Return 'N/A' if tag 'Name' is not found
 
-def list_instances_in_all_regions_to_csv():
-    ec2_client = boto3.client('ec2')
-    sts_client = boto3.client('sts')
+def instance_filters(states=None, tag_keys=None, vpc_ids=None):
+    """
+    Return describe_instances filters selecting instances server-side.
+
+    :param states: Instance states to keep, e.g. ['running'].
+    :param tag_keys: Tag keys instances must carry (each one is required).
+    :param vpc_ids: VPCs to keep instances of.
+    """
+    filters = []
+    if states:
+        filters.append({'Name': 'instance-state-name', 'Values': list(states)})
+    for tag_key in tag_keys or []:
+        filters.append({'Name': 'tag-key', 'Values': [tag_key]})
+    if vpc_ids:
+        filters.append({'Name': 'vpc-id', 'Values': list(vpc_ids)})
+    return filters
+
+def iter_region_instances(ec2_client, region, filters=None):
+    """
+    Page through describe_instances for a single region.
+
+    Filtering is done by the API and pages are requested at PAGE_SIZE. Only the
+    CSV fields are copied out of each page, and the rows are handed over page by
+    page, so a region never has to be held in memory whole.
+
+    :param ec2_client: EC2 client for the region.
+    :param region: The region being scanned.
+    :param filters: Optional describe_instances filters (see instance_filters).
+    :return: Generator of lists of CSV rows, one per page.
+    """
+    paginator = ec2_client.get_paginator('describe_instances')
+    pages = paginator.paginate(Filters=filters or [], PaginationConfig={'PageSize': PAGE_SIZE})
+
+    for page in pages:
+        yield [
+            {
+                'Region': region,
+                'Instance ID': instance['InstanceId'],
+                'Instance Name': get_instance_name(instance),
+                'Instance Type': instance['InstanceType'],
+                'State': instance['State']['Name'],
+                'Public IP': instance.get('PublicIpAddress') or 'N/A',
+                'Private IP': instance.get('PrivateIpAddress') or 'N/A',
+                'Launch Time': instance['LaunchTime']
+            }
+            for reservation in page['Reservations']
+            for instance in reservation['Instances']
+        ]
+
+def tag_fingerprint(ec2_client):
+    """
+    Return a cheap fingerprint of a region's instances: how many are tagged and a hash of their tags.
+
+    describe_tags pages are far smaller than describe_instances ones, but they
+    miss untagged instances and state changes, so the fingerprint is only
+    trusted with --skip-unchanged.
+    """
+    digest = hashlib.sha1()
+    instance_ids = set()
+    paginator = ec2_client.get_paginator('describe_tags')
+    for page in paginator.paginate(Filters=[{'Name': 'resource-type', 'Values': ['instance']}],
+                                   PaginationConfig={'PageSize': 1000}):
+        for tag in page['Tags']:
+            instance_ids.add(tag['ResourceId'])
+            digest.update(f"{tag['ResourceId']}\0{tag['Key']}\0{tag['Value']}\n".encode('utf-8'))
+    return f"{len(instance_ids)}:{digest.hexdigest()}"
+
+def iter_instance_records(pool, include_account, max_workers=MAX_WORKERS, snapshot=None, skip_unchanged=False,
+                          filters=None):
+    """
+    Yield the rows of every account/region in the pool page by page, as the pages arrive.
+
+    Regions are scanned concurrently and hand their pages to the calling thread
+    through a bounded queue, so memory stays flat however large a region is and
+    records are only yielded to the calling thread.
+
+    :param snapshot: Optional SnapshotRun every region is recorded in.
+    :param skip_unchanged: Carry regions whose tag fingerprint did not change over from the previous snapshot.
+    :param filters: Optional describe_instances filters (see instance_filters).
+    """
+    pages = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+    done = object()
+    stopped = threading.Event()  # Set when the caller stops reading
+
+    def collect(ec2_client, region, account_id):
+        fingerprint = tag_fingerprint(ec2_client) if skip_unchanged else None
+        if fingerprint and fingerprint == snapshot.previous_fingerprint(account_id, region):
+            rows = snapshot.carry_over(account_id, region, fingerprint)
+            pages.put((account_id, rows))
+            return len(rows)
+
+        count = 0
+        for rows in iter_region_instances(ec2_client, region, filters):
+            if stopped.is_set():
+                return count
+            if snapshot:
+                snapshot.add_records(account_id, region, rows)
+            pages.put((account_id, rows))
+            count += len(rows)
+        if snapshot:
+            snapshot.complete_region(account_id, region, fingerprint)
+        return count
+
+    def run_sweep():
+        sweep_start = time.perf_counter()
+        scanned = 0
+        try:
+            for account_id, region, count, elapsed in sweep(pool, 'ec2', collect, max_workers, with_account=True):
+                scanned += 1
+                print(f"{account_id} {region}: {count} instances in {elapsed:.2f}s")
+            print(f"Scanned {scanned} regions in {time.perf_counter() - sweep_start:.2f}s.")
+        finally:
+            pages.put(done)
+
+    sweeper = threading.Thread(target=run_sweep, daemon=True)
+    sweeper.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            account_id, rows = item
+            for row in rows:
+                if include_account:
+                    row[ACCOUNT_FIELD] = account_id
+                yield row
+    finally:
+        # If the caller stopped early, unblock the scans still waiting to hand over a page
+        stopped.set()
+        while sweeper.is_alive():
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def write_instances(pool, file_name, include_account, max_workers=MAX_WORKERS, fmt=None,
+                    snapshot_file=None, skip_unchanged=False, filters=None):
+    """
+    Sweep every account/region in the pool and stream the rows to a single CSV, JSONL or Parquet file.
+
+    With snapshot_file, the run is also recorded there and the changes since the
+    previous run are written next to the output file. Filtered runs are kept
+    apart from unfiltered ones, so filtering does not show up as removals.
+    """
+    fieldnames = ([ACCOUNT_FIELD] if include_account else []) + FIELDNAMES
+    store = SnapshotStore(snapshot_file) if snapshot_file else None
+    # Filters are put in a canonical order so that '--state running stopped' and
+    # '--state stopped running' are diffed against the same history
+    canonical = sorted([f['Name'], sorted(f['Values'])] for f in filters or [])
+    kind = f"ec2 {json.dumps(canonical)}" if canonical else 'ec2'
+    snapshot = store.start_run(kind, ['Instance ID']) if store else None
+
+    with open_writer(file_name, fieldnames, fmt) as writer:
+        writer.write_all(iter_instance_records(pool, include_account, max_workers, snapshot, skip_unchanged, filters))
+
+    print(f"Instance information has been saved to {file_name}.")
+    if store:
+        finish_and_report(snapshot, file_name, fmt)
+        store.close()
+    print_api_summary()
+
+def list_instances_in_all_regions_to_csv(max_workers=MAX_WORKERS, session=None, fmt=None, **options):
+    session = session or default_session()
+    sts_client = get_client('sts', session=session)
 
     # Get the AWS Account ID
     account_id = sts_client.get_caller_identity()["Account"]
@@ -20,37 +211,56 @@ def list_instances_in_all_regions_to_csv():
     today = datetime.now().strftime('%Y-%m-%d')
 
     # Generate file name
-    file_name = f"aws_instances_{account_id}_{today}.csv"
-
-    # Get Regions
-    regions = [region['RegionName'] for region in ec2_client.describe_regions()['Regions']]
-
-    # Create CSV file
-    with open(file_name, 'w', newline='') as csvfile:
-        fieldnames = ['Region', 'Instance ID', 'Instance Name', 'Instance Type', 'State', 'Public IP', 'Private IP', 'Launch Time']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
-
-        # Iterate through all regions
-        for region in regions:
-            ec2 = boto3.resource('ec2', region_name=region)
-            instances = ec2.instances.all()
-
-            for instance in instances:
-                instance_name = get_instance_name(instance)
-                writer.writerow({
-                    'Region': region,
-                    'Instance ID': instance.id,
-                    'Instance Name': instance_name,
-                    'Instance Type': instance.instance_type,
-                    'State': instance.state['Name'],
-                    'Public IP': instance.public_ip_address or 'N/A',
-                    'Private IP': instance.private_ip_address or 'N/A',
-                    'Launch Time': instance.launch_time
-                })
+    file_name = output_path(f"aws_instances_{account_id}_{today}.csv", fmt)
 
-    print(f"Instance information has been saved to {file_name}.")
+    pool = AccountSessionPool([(account_id, None)], base_session=session)
+    write_instances(pool, file_name, include_account=False, max_workers=max_workers, fmt=fmt, **options)
+
+def list_instances_in_organization_to_csv(accounts, max_workers=MAX_WORKERS, session=None, fmt=None, **options):
+    """
+    Write the instances of several accounts to one consolidated CSV file.
+
+    :param accounts: List of (account_id, role_arn) tuples to assume into.
+    :param max_workers: Maximum number of concurrent region scans across all accounts.
+    :param session: Optional boto3 session used to assume the roles.
+    :param fmt: Output format (csv, jsonl or parquet).
+    :param options: snapshot_file, skip_unchanged and filters, passed to write_instances.
+    """
+    today = datetime.now().strftime('%Y-%m-%d')
+    file_name = output_path(f"aws_instances_org_{today}.csv", fmt)
+
+    pool = AccountSessionPool(accounts, base_session=session)
+    write_instances(pool, file_name, include_account=True, max_workers=max_workers, fmt=fmt, **options)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List EC2 instances in every region to a CSV file.")
+    parser.add_argument('--accounts', help="File with account IDs or role ARNs (one per line) for an org-wide sweep")
+    parser.add_argument('--role-name', default=DEFAULT_ROLE_NAME, help="Role assumed for plain account IDs")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Maximum concurrent region scans")
+    parser.add_argument('--format', choices=FORMATS, help="Output format (default: csv)")
+    parser.add_argument('--snapshot', nargs='?', const=SNAPSHOT_FILE, metavar='DB',
+                        help=f"Record the run and report changes since the previous one (default DB: {SNAPSHOT_FILE})")
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help="With --snapshot, reuse regions whose instance tags did not change")
+    parser.add_argument('--state', nargs='+', choices=INSTANCE_STATES, help="Only list instances in these states")
+    parser.add_argument('--tag-key', nargs='+', default=[], help="Only list instances carrying all of these tag keys")
+    parser.add_argument('--vpc', nargs='+', help="Only list instances in these VPC IDs")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
+    if args.skip_unchanged and not args.snapshot:
+        parser.error("--skip-unchanged requires --snapshot")
+
+    options = {
+        'snapshot_file': args.snapshot,
+        'skip_unchanged': args.skip_unchanged,
+        'filters': instance_filters(args.state, args.tag_key, args.vpc)
+    }
+    if args.accounts:
+        list_instances_in_organization_to_csv(load_accounts(args.accounts, args.role_name), args.workers,
+                                              fmt=args.format, **options)
+    else:
+        list_instances_in_all_regions_to_csv(args.workers, fmt=args.format, **options)
 
 if __name__ == "__main__":
-    list_instances_in_all_regions_to_csv()
\ No newline at end of file
+    main()
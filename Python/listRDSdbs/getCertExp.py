@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client
+from common.sessions import AccountSessionPool
+from common.sweep import sweep
+from common.throttling import print_api_summary
+from common.writers import FORMATS, open_writer, output_path
+from listRDSdbs import iter_db_instances
+
+# Number of days before expiration to check
+DAYS_BEFORE_EXPIRATION = 30
+
+# File to export results
+OUTPUT_FILE = "rds_expiring_certs.csv"
+FIELDNAMES = ["Region", "DBInstanceIdentifier", "CACertificateIdentifier", "CAExpirationDate",
+              "ExpiresWithinThreshold", "AutoMinorVersionUpgrade"]
+
+# Per-region certificate catalogs change rarely, so they are cached on disk
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "aws-scripts", "rds_certificates.json")
+CACHE_TTL = 7 * 24 * 60 * 60
+
+# Maximum number of regions scanned at the same time
+MAX_WORKERS = 10
+
+
+class CertificateCatalog:
+    """
+    CA certificate expiration dates per region, fetched with one paginated
+    describe_certificates per region and cached in memory and on disk.
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, ttl=CACHE_TTL):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        try:
+            with open(cache_file, "r") as file:
+                self.regions = json.load(file)
+        except (OSError, ValueError):
+            self.regions = {}
+
+    def get(self, rds_client, region, required=()):
+        """
+        Return {certificate_id: ValidTill ISO string} for a region.
+
+        :param required: Certificate IDs in use; a cached map missing any of them
+                         (e.g. a CA added since it was fetched) is fetched again.
+        """
+        with self.lock:
+            cached = self.regions.get(region)
+        if (cached and time.time() - cached["fetched"] < self.ttl
+                and all(certificate_id in cached["certificates"] for certificate_id in required)):
+            return cached["certificates"]
+
+        certificates = {}
+        for page in rds_client.get_paginator("describe_certificates").paginate():
+            for certificate in page["Certificates"]:
+                valid_till = certificate["ValidTill"].astimezone(timezone.utc)
+                certificates[certificate["CertificateIdentifier"]] = valid_till.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        with self.lock:
+            self.regions[region] = {"fetched": time.time(), "certificates": certificates}
+        return certificates
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        with self.lock, open(self.cache_file, "w") as file:
+            json.dump(self.regions, file)
+
+
+def collect_region_certificates(rds_client, region, catalog, threshold_date):
+    """Join a region's instances with its certificate catalog into output records."""
+    db_instances = list(iter_db_instances(rds_client))
+    if not db_instances:
+        return []  # No need for the catalog in empty regions
+
+    in_use = {db_instance["CACertificateIdentifier"] for db_instance in db_instances
+              if "CACertificateIdentifier" in db_instance}
+    certificates = catalog.get(rds_client, region, in_use)
+    rows = []
+    for db_instance in db_instances:
+        ca_certificate_identifier = db_instance.get("CACertificateIdentifier", "N/A")
+        expiration_date = certificates.get(ca_certificate_identifier, "N/A")
+        expires_within_threshold = "Yes" if expiration_date != "N/A" and expiration_date < threshold_date else "No"
+        rows.append({
+            "Region": region,
+            "DBInstanceIdentifier": db_instance["DBInstanceIdentifier"],
+            "CACertificateIdentifier": ca_certificate_identifier,
+            "CAExpirationDate": expiration_date,
+            "ExpiresWithinThreshold": expires_within_threshold,
+            "AutoMinorVersionUpgrade": db_instance.get("AutoMinorVersionUpgrade", "N/A")
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List RDS instances whose CA certificate expires soon.")
+    parser.add_argument("--days", type=int, default=DAYS_BEFORE_EXPIRATION, help="Expiration threshold in days")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Maximum concurrent region scans")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: csv)")
+    args = parser.parse_args(argv)
+
+    threshold_date = (datetime.now(timezone.utc) + timedelta(days=args.days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    catalog = CertificateCatalog()
+
+    def collect(rds_client, region):
+        return collect_region_certificates(rds_client, region, catalog, threshold_date)
+
+    account_id = get_client("sts").get_caller_identity()["Account"]
+    pool = AccountSessionPool([(account_id, None)])
+
+    output_file = output_path(OUTPUT_FILE, args.format)
+    with open_writer(output_file, FIELDNAMES, args.format) as writer:
+        for _, region, rows, elapsed in sweep(pool, "rds", collect, args.workers):
+            writer.write_all(rows)
+            expiring = sum(row["ExpiresWithinThreshold"] == "Yes" for row in rows)
+            print(f"Checked region {region}: {len(rows)} instances, {expiring} expiring within {args.days} days ({elapsed:.2f}s)")
+
+    catalog.save()
+    print(f"Check complete. Results saved to {output_file}.")
+    print_api_summary()
+
+
+if __name__ == "__main__":
+    main()
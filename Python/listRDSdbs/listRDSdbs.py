@@ -1,75 +1,184 @@
-import boto3
-import csv
-from datetime import datetime
+import argparse
+import os
+import sys
+import time
 
-# Initialize clients
-sts_client = boto3.client("sts")
-ec2_client = boto3.client("ec2")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common import instrumentation
+from common.clients import get_client
+from common.sessions import ACCOUNT_FIELD, AccountSessionPool, DEFAULT_ROLE_NAME, load_accounts
+from common.snapshots import SNAPSHOT_FILE, SnapshotStore, finish_and_report
+from common.sweep import sweep
+from common.throttling import print_api_summary
+from common.writers import FORMATS, open_writer, output_path
 
-# Get the AWS Account ID
-account_id = sts_client.get_caller_identity()["Account"]
+# Define the fields to extract
+fields = ["ResourceType", "Region", "Identifier", "Status", "Role", "Engine", "Size", "MultiAZ", "CreationDate",
+          "CACertificate", "AutoMinorVersionUpgrade", "Storage", "Members"]
 
-# Define the output CSV file name with account name
-OUTPUT_FILE = f"{account_id}_rds_resources.csv"
+# Maximum number of regions scanned at the same time
+MAX_WORKERS = 10
 
-# Get all available regions
-regions = [region["RegionName"] for region in ec2_client.describe_regions()["Regions"]]
 
-# Define the fields to extract
-fields = ["ResourceType", "Region", "Identifier", "Status", "Role", "Engine", "Size", "MultiAZ", "CreationDate"]
-
-# Open the CSV file to write
-with open(OUTPUT_FILE, mode="w", newline="") as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(fields)  # Write header row
-    
-    # Iterate through each region to list RDS instances and clusters
-    for region in regions:
-        print(f"Checking RDS resources in region: {region}")
-        rds_client = boto3.client("rds", region_name=region)
-        
-        # Retrieve and write RDS instances
-        try:
-            response = rds_client.describe_db_instances()
-            db_instances = response["DBInstances"]
-            
-            for db_instance in db_instances:
-                # Extract relevant fields for each RDS instance
-                resource_type = "Instance"
-                identifier = db_instance["DBInstanceIdentifier"]
-                status = db_instance["DBInstanceStatus"]
-                role = db_instance.get("ReadReplicaSourceDBInstanceIdentifier", "Primary")
-                engine = db_instance["Engine"]
-                size = db_instance["DBInstanceClass"]
-                multi_az = db_instance["MultiAZ"]
-                creation_date = db_instance["InstanceCreateTime"].strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Write row to CSV file
-                writer.writerow([resource_type, region, identifier, status, role, engine, size, multi_az, creation_date])
-
-        except Exception as e:
-            print(f"Could not retrieve RDS instances in region {region}: {e}")
-
-        # Retrieve and write RDS clusters
-        try:
-            response = rds_client.describe_db_clusters()
-            db_clusters = response["DBClusters"]
-            
-            for db_cluster in db_clusters:
-                # Extract relevant fields for each RDS cluster
-                resource_type = "Cluster"
-                identifier = db_cluster["DBClusterIdentifier"]
-                status = db_cluster["Status"]
-                role = "Primary" if not db_cluster.get("ReadReplicaIdentifiers") else "Replica"
-                engine = db_cluster["Engine"]
-                size = "N/A"  # Cluster has instances with their own sizes
-                multi_az = db_cluster.get("MultiAZ", "Unknown")
-                creation_date = db_cluster["ClusterCreateTime"].strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Write row to CSV file
-                writer.writerow([resource_type, region, identifier, status, role, engine, size, multi_az, creation_date])
-
-        except Exception as e:
-            print(f"Could not retrieve RDS clusters in region {region}: {e}")
-
-print(f"RDS resource information has been written to {OUTPUT_FILE}")
+def iter_db_instances(rds_client):
+    """Yield every RDS instance of the client's region, across all pages."""
+    for page in rds_client.get_paginator("describe_db_instances").paginate():
+        yield from page["DBInstances"]
+
+
+def iter_db_clusters(rds_client):
+    """Yield every RDS cluster of the client's region, across all pages."""
+    for page in rds_client.get_paginator("describe_db_clusters").paginate():
+        yield from page["DBClusters"]
+
+
+def format_storage(resource):
+    """Return allocated storage and type, e.g. '100 GiB gp3'."""
+    if "AllocatedStorage" not in resource:
+        return "N/A"
+    return f"{resource['AllocatedStorage']} GiB {resource.get('StorageType', '')}".strip()
+
+
+def collect_region_rds(rds_client, region):
+    """
+    Return one row per RDS instance and cluster in a region.
+
+    :return: Tuple of (rows, complete); complete is False if either listing failed,
+             in which case the rows of the other one are still returned.
+    """
+    rows = []
+    complete = True
+    instance_classes = {}
+    print(f"Checking RDS resources in region: {region}")
+
+    # Retrieve RDS instances
+    try:
+        for db_instance in iter_db_instances(rds_client):
+            # Extract relevant fields for each RDS instance
+            resource_type = "Instance"
+            identifier = db_instance["DBInstanceIdentifier"]
+            status = db_instance["DBInstanceStatus"]
+            role = db_instance.get("ReadReplicaSourceDBInstanceIdentifier", "Primary")
+            engine = db_instance["Engine"]
+            size = db_instance["DBInstanceClass"]
+            multi_az = db_instance["MultiAZ"]
+            creation_date = db_instance["InstanceCreateTime"].strftime("%Y-%m-%d %H:%M:%S")
+            ca_certificate = db_instance.get("CACertificateIdentifier", "N/A")
+            auto_minor_version_upgrade = db_instance.get("AutoMinorVersionUpgrade", "N/A")
+            storage = format_storage(db_instance)
+            members = "N/A"  # Only clusters have members
+
+            instance_classes[identifier] = size
+            rows.append([resource_type, region, identifier, status, role, engine, size, multi_az, creation_date,
+                         ca_certificate, auto_minor_version_upgrade, storage, members])
+
+    except Exception as e:
+        print(f"Could not retrieve RDS instances in region {region}: {e}")
+        complete = False
+
+    # Retrieve RDS clusters
+    try:
+        for db_cluster in iter_db_clusters(rds_client):
+            # Extract relevant fields for each RDS cluster
+            resource_type = "Cluster"
+            identifier = db_cluster["DBClusterIdentifier"]
+            status = db_cluster["Status"]
+            role = "Primary" if not db_cluster.get("ReadReplicaIdentifiers") else "Replica"
+            engine = db_cluster["Engine"]
+            multi_az = db_cluster.get("MultiAZ", "Unknown")
+            creation_date = db_cluster["ClusterCreateTime"].strftime("%Y-%m-%d %H:%M:%S")
+            ca_certificate = db_cluster.get("CertificateDetails", {}).get("CAIdentifier", "N/A")
+            auto_minor_version_upgrade = db_cluster.get("AutoMinorVersionUpgrade", "N/A")
+            storage = format_storage(db_cluster)
+
+            # Cluster members are sized individually; join them with the instances listed above
+            member_classes = []
+            for member in db_cluster.get("DBClusterMembers", []):
+                member_id = member["DBInstanceIdentifier"]
+                member_role = "writer" if member.get("IsClusterWriter") else "reader"
+                member_classes.append((member_id, member_role, instance_classes.get(member_id, "unknown")))
+            size = ", ".join(sorted({member_class for _, _, member_class in member_classes})) or "N/A"
+            members = "; ".join(f"{member_id} ({member_role}, {member_class})"
+                                for member_id, member_role, member_class in member_classes) or "N/A"
+
+            rows.append([resource_type, region, identifier, status, role, engine, size, multi_az, creation_date,
+                         ca_certificate, auto_minor_version_upgrade, storage, members])
+
+    except Exception as e:
+        print(f"Could not retrieve RDS clusters in region {region}: {e}")
+        complete = False
+
+    return rows, complete
+
+
+def iter_rds_records(pool, include_account, max_workers=MAX_WORKERS, snapshot=None):
+    """
+    Yield one record per RDS instance and cluster of every account/region in the pool as each region finishes.
+
+    :param snapshot: Optional SnapshotRun every fully listed region is recorded in.
+    """
+    sweep_start = time.perf_counter()
+
+    for account_id, region, (rows, complete), elapsed in sweep(pool, "rds", collect_region_rds, max_workers):
+        records = [dict(zip(fields, row)) for row in rows]
+        # A region with a failed listing is left out of the snapshot, so its resources are not reported as removed
+        if snapshot and complete:
+            snapshot.add_region(account_id, region, records)
+        for record in records:
+            if include_account:
+                record[ACCOUNT_FIELD] = account_id
+            yield record
+        print(f"{account_id} {region}: {len(rows)} RDS resources in {elapsed:.2f}s")
+
+    print(f"Sweep finished in {time.perf_counter() - sweep_start:.2f}s.")
+
+
+def write_rds(pool, output_file, include_account, max_workers=MAX_WORKERS, fmt=None, snapshot_file=None):
+    """
+    Sweep every account/region in the pool and stream the records to a single CSV, JSONL or Parquet file.
+
+    With snapshot_file, the run is also recorded there and the changes since the
+    previous run are written next to the output file.
+    """
+    fieldnames = ([ACCOUNT_FIELD] if include_account else []) + fields
+    store = SnapshotStore(snapshot_file) if snapshot_file else None
+    snapshot = store.start_run("rds", ["ResourceType", "Identifier"]) if store else None
+
+    with open_writer(output_file, fieldnames, fmt) as writer:
+        writer.write_all(iter_rds_records(pool, include_account, max_workers, snapshot))
+
+    print(f"RDS resource information has been written to {output_file}")
+    if store:
+        finish_and_report(snapshot, output_file, fmt)
+        store.close()
+    print_api_summary()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List RDS instances and clusters in every region to a CSV file.")
+    parser.add_argument("--accounts", help="File with account IDs or role ARNs (one per line) for an org-wide sweep")
+    parser.add_argument("--role-name", default=DEFAULT_ROLE_NAME, help="Role assumed for plain account IDs")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Maximum concurrent region scans")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (default: csv)")
+    parser.add_argument("--snapshot", nargs="?", const=SNAPSHOT_FILE, metavar="DB",
+                        help=f"Record the run and report changes since the previous one (default DB: {SNAPSHOT_FILE})")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.setup(args)
+
+    if args.accounts:
+        pool = AccountSessionPool(load_accounts(args.accounts, args.role_name))
+        write_rds(pool, output_path("org_rds_resources.csv", args.format), include_account=True,
+                  max_workers=args.workers, fmt=args.format, snapshot_file=args.snapshot)
+    else:
+        # Get the AWS Account ID
+        account_id = get_client("sts").get_caller_identity()["Account"]
+
+        # Define the output CSV file name with account name
+        pool = AccountSessionPool([(account_id, None)])
+        write_rds(pool, output_path(f"{account_id}_rds_resources.csv", args.format), include_account=False,
+                  max_workers=args.workers, fmt=args.format, snapshot_file=args.snapshot)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,15 @@
-import boto3
+import argparse
+import csv
+import os
+import re
+import sys
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.clients import get_client
+from common.region_index import FILTER_CHUNK_SIZE, parse_tag, resolve_instance_regions
+from common.throttling import print_api_summary
 
 # Input the required information here
 INSTANCE_IDS = [
@@ -7,31 +18,168 @@ INSTANCE_IDS = [
     'i-0db794393028468f6',
     'i-01d1130a967f9db04',
     'i-02cd56028f45a1122'
-]  
+]
 TAGS = {
     "arm_crash_dump": "true"
 }  # Replace with your key-value pairs
 REGIONS = ['us-east-1', 'us-west-1', 'us-east-2', 'us-west-2', 'eu-central-1', 'ap-south-1']  # List of AWS regions to search
 
-def find_instance_region(instance_id, regions):
+TAG_CHUNK_SIZE = 500  # Instance IDs per create_tags call, well under the request size limit
+MAX_WORKERS = 10      # Regions tagged at the same time
+
+# Instances in these states are left alone (tagging them fails or is pointless)
+LIVE_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+# Errors caused by particular instances in a create_tags call; only these are worth
+# splitting a chunk over, any other error (e.g. UnauthorizedOperation) fails every ID alike
+ID_ERROR_PREFIXES = ('InvalidInstanceID.', 'IncorrectInstanceState')
+
+_instance_id = re.compile(r"i-[0-9a-f]+")
+
+
+def iter_instance_tags(ec2_client, filters):
+    """Yield (instance_id, {key: value}) for every live instance matching the filters."""
+    filters = filters + [{'Name': 'instance-state-name', 'Values': LIVE_STATES}]
+    paginator = ec2_client.get_paginator('describe_instances')
+    for page in paginator.paginate(Filters=filters, PaginationConfig={'PageSize': 1000}):
+        for reservation in page['Reservations']:
+            for instance in reservation['Instances']:
+                yield instance['InstanceId'], {tag['Key']: tag['Value'] for tag in instance.get('Tags') or ()}
+
+
+def current_tags(ec2_client, instance_ids=None, filters=None):
     """
-    Finds the region where a specific EC2 instance exists.
+    Return {instance_id: tags} of the given instances, or of the instances matching filters.
 
-    :param instance_id: The ID of the instance to locate.
-    :param regions: List of AWS regions to search.
-    :return: The region where the instance is found, or None if not found.
+    IDs are sent as instance-id filters in chunks, so IDs that no longer exist
+    are simply left out instead of failing the call.
+    """
+    if instance_ids is None:
+        return dict(iter_instance_tags(ec2_client, filters))
+
+    found = {}
+    for i in range(0, len(instance_ids), FILTER_CHUNK_SIZE):
+        chunk = instance_ids[i:i + FILTER_CHUNK_SIZE]
+        found.update(iter_instance_tags(ec2_client, [{'Name': 'instance-id', 'Values': chunk}]))
+    return found
+
+
+def create_tags_in_chunks(ec2_client, instance_ids, tags):
     """
-    for region in regions:
-        ec2_client = boto3.client('ec2', region_name=region)
+    Tag instances with one create_tags call per TAG_CHUNK_SIZE IDs.
+
+    A call failing with an instance-specific error is retried without the IDs
+    its error names; if it names none, the chunk is split in half until the
+    failing IDs are isolated, so one bad ID never fails the rest of its chunk.
+    Any other error fails the whole chunk at once.
+
+    :return: (number of instances tagged, {instance_id: error} of the ones that could not be).
+    """
+    formatted_tags = [{'Key': key, 'Value': value} for key, value in tags.items()]
+    pending = [instance_ids[i:i + TAG_CHUNK_SIZE] for i in range(0, len(instance_ids), TAG_CHUNK_SIZE)]
+    tagged = 0
+    failed = {}
+
+    while pending:
+        chunk = pending.pop()
         try:
-            response = ec2_client.describe_instances(InstanceIds=[instance_id])
-            if response['Reservations']:
-                return region
-        except Exception:
-            pass  # Ignore exceptions for regions where the instance is not found
-    return None
-
-def tag_instances(instance_ids, tags, regions):
+            ec2_client.create_tags(Resources=chunk, Tags=formatted_tags)
+            tagged += len(chunk)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            error = f"{code}: {e.response['Error']['Message']}"
+            named = set(_instance_id.findall(e.response['Error']['Message'])) & set(chunk)
+            if len(chunk) == 1 or not code.startswith(ID_ERROR_PREFIXES):
+                failed.update((instance_id, error) for instance_id in chunk)
+            elif named:
+                failed.update((instance_id, error) for instance_id in named)
+                remainder = [instance_id for instance_id in chunk if instance_id not in named]
+                if remainder:
+                    pending.append(remainder)
+            else:
+                middle = len(chunk) // 2
+                pending.extend([chunk[:middle], chunk[middle:]])
+
+    return tagged, failed
+
+
+def tag_region(region, tags, instance_ids=None, filters=None, dry_run=False):
+    """
+    Tag the instances of one region that do not carry the tags yet.
+
+    :param instance_ids: Instances to tag, or None to select them with filters.
+    :param filters: describe_instances filters selecting the instances to tag.
+    :return: Dictionary with the region's counts, failed IDs and IDs not found.
+    """
+    ec2_client = get_client('ec2', region)
+    tags_by_id = current_tags(ec2_client, instance_ids, filters)
+
+    # The diff is taken from the describe results, so a rerun only writes what is missing
+    to_tag = sorted(
+        instance_id for instance_id, current in tags_by_id.items()
+        if any(current.get(key) != value for key, value in tags.items())
+    )
+    result = {
+        'found': len(tags_by_id),
+        'already_tagged': len(tags_by_id) - len(to_tag),
+        'tagged': 0,
+        'failed': {},
+        'missing': [instance_id for instance_id in instance_ids or [] if instance_id not in tags_by_id],
+        'to_tag': to_tag
+    }
+    if to_tag and not dry_run:
+        result['tagged'], result['failed'] = create_tags_in_chunks(ec2_client, to_tag, tags)
+    return result
+
+
+def tag_targets(instances_by_region, tags, max_workers=MAX_WORKERS, dry_run=False, filters=None):
+    """
+    Tag instances in every region concurrently.
+
+    :param instances_by_region: Dictionary {region: [instance_id, ...]}; with filters, {region: None}.
+    :param tags: Dictionary of key-value pairs to use as tags.
+    :param filters: describe_instances filters selecting the instances instead of IDs.
+    :return: Total number of instances that could not be tagged.
+    """
+    totals = {'found': 0, 'already_tagged': 0, 'tagged': 0, 'failed': 0, 'missing': 0}
+    tagged_label = 'to tag' if dry_run else 'tagged'
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(tag_region, region, tags, instance_ids, filters, dry_run): region
+            for region, instance_ids in instances_by_region.items()
+        }
+
+        for future in as_completed(futures):
+            region = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Failed to tag instances in region {region}: {e}")
+                continue
+
+            for instance_id in result['missing']:
+                print(f"Instance {instance_id} not found in region {region}. Skipping...")
+            for instance_id, error in sorted(result['failed'].items()):
+                print(f"Failed to tag instance {instance_id} in region {region}: {error}")
+            if dry_run and result['to_tag']:
+                print(f"{region}: would tag {', '.join(result['to_tag'])}")
+            tagged = len(result['to_tag']) if dry_run else result['tagged']
+            print(f"{region}: {result['found']} instances found, {result['already_tagged']} already tagged, "
+                  f"{tagged} {tagged_label}, {len(result['failed'])} failed")
+
+            totals['found'] += result['found']
+            totals['already_tagged'] += result['already_tagged']
+            totals['tagged'] += tagged
+            totals['failed'] += len(result['failed'])
+            totals['missing'] += len(result['missing'])
+
+    print(f"Total: {totals['found']} instances found, {totals['already_tagged']} already tagged, "
+          f"{totals['tagged']} {tagged_label}, {totals['failed']} failed, {totals['missing']} not found.")
+    return totals['failed']
+
+
+def tag_instances(instance_ids, tags, regions, max_workers=MAX_WORKERS, dry_run=False):
     """
     Tags EC2 instances with the specified keys and values.
 
@@ -39,32 +187,66 @@ def tag_instances(instance_ids, tags, regions):
     :param tags: Dictionary of key-value pairs to use as tags.
     :param regions: List of AWS regions to search.
     """
-    formatted_tags = [{'Key': key, 'Value': value} for key, value in tags.items()]
     instances_to_tag = {}
 
     # Find the region for each instance
+    instance_regions = resolve_instance_regions(instance_ids, regions, max_workers=max_workers)
     for instance_id in instance_ids:
-        region = find_instance_region(instance_id, regions)
+        region = instance_regions.get(instance_id)
         if region:
-            if region not in instances_to_tag:
-                instances_to_tag[region] = []
-            instances_to_tag[region].append(instance_id)
+            instances_to_tag.setdefault(region, []).append(instance_id)
         else:
             print(f"Instance {instance_id} not found in any region. Skipping...")
 
-    # Tag the instances in their respective regions
-    for region, ids in instances_to_tag.items():
-        ec2_client = boto3.client('ec2', region_name=region)
-        try:
-            ec2_client.create_tags(Resources=ids, Tags=formatted_tags)
-            print(f"Successfully tagged instances {ids} in region {region} with {tags}")
-        except Exception as e:
-            print(f"Failed to tag instances {ids} in region {region}: {e}")
+    return tag_targets(instances_to_tag, tags, max_workers, dry_run)
 
-if __name__ == "__main__":
-    if not INSTANCE_IDS:
-        print("Error: No instance IDs provided. Please update the script with the required instance IDs.")
-    elif not TAGS:
+
+def read_inventory(file_path):
+    """Return {region: [instance_id, ...]} from a CSV written by listec2s.py."""
+    targets = {}
+    with open(file_path, 'r', newline='') as file:
+        for row in csv.DictReader(file):
+            targets.setdefault(row['Region'], []).append(row['Instance ID'])
+    return targets
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tag EC2 instances with TAGS, skipping the ones that already carry them.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--ids-file', help="File with one instance ID per line (defaults to INSTANCE_IDS)")
+    source.add_argument('--inventory', help="Instance CSV written by listec2s.py (its Region column is used)")
+    source.add_argument('--select', type=parse_tag, action='append', metavar='KEY=VALUE',
+                        help="Select every instance carrying this tag (repeat to require several)")
+    parser.add_argument('--tag', type=parse_tag, action='append', metavar='KEY=VALUE',
+                        help="Tag to apply (repeatable; defaults to TAGS)")
+    parser.add_argument('--regions', nargs='+', default=REGIONS, help="Regions to search (default: REGIONS)")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Regions tagged at the same time")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which instances would be tagged")
+    args = parser.parse_args(argv)
+
+    tags = dict(args.tag) if args.tag else TAGS
+    if not tags:
         print("Error: No tags provided. Please update the script with the required tags.")
+        return
+
+    if args.select:
+        filters = [{'Name': f"tag:{key}", 'Values': [value]} for key, value in args.select]
+        failed = tag_targets(dict.fromkeys(args.regions), tags, args.workers, args.dry_run, filters)
+    elif args.inventory:
+        failed = tag_targets(read_inventory(args.inventory), tags, args.workers, args.dry_run)
     else:
-        tag_instances(INSTANCE_IDS, TAGS, REGIONS)
+        instance_ids = INSTANCE_IDS
+        if args.ids_file:
+            with open(args.ids_file, 'r') as file:
+                instance_ids = [line.strip() for line in file if line.strip()]
+        if not instance_ids:
+            print("Error: No instance IDs provided. Please update the script with the required instance IDs.")
+            return
+        failed = tag_instances(list(dict.fromkeys(instance_ids)), tags, args.regions, args.workers, args.dry_run)
+
+    print_api_summary()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
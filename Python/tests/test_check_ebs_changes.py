@@ -0,0 +1,57 @@
+import gzip
+import json
+import os
+import sys
+
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "checkEBSchanges"))
+import checkEBSchanges
+from common import clients, instrumentation
+
+LOG_FILES = 60
+
+
+def log_file(index):
+    record = {"eventID": f"event-{index}", "eventName": "ModifyVolume", "eventTime": "2024-12-15T00:00:00Z",
+              "awsRegion": "us-east-1",
+              "requestParameters": {"ModifyVolumeRequest": {"VolumeId": f"vol-{index}", "Size": 20}},
+              "responseElements": {"ModifyVolumeResponse": {"volumeModification": {
+                  "originalSize": 10, "targetSize": 20}}}}
+    return gzip.compress(json.dumps({"Records": [record]}).encode())
+
+
+@pytest.fixture
+def trail_bucket(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with mock_aws():
+        s3 = clients.get_client("s3")
+        s3.create_bucket(Bucket="trail-logs")
+        for index in range(LOG_FILES):
+            s3.put_object(Bucket="trail-logs", Key=f"AWSLogs/{index:03}.json.gz", Body=log_file(index))
+        clients.clear()  # Clients created before --trace is enabled carry no hooks
+        yield "s3://trail-logs/AWSLogs/"
+        clients.clear()
+
+
+def test_trace_with_logs_is_written_by_the_parent_only(trail_bucket, tmp_path):
+    trace_file = str(tmp_path / "trace.json")
+    try:
+        checkEBSchanges.main(["--logs", trail_bucket, "--processes", "2", "--start", "2024-12-01T00:00:00Z",
+                              "--end", "2024-12-31T00:00:00Z", "--trace", trace_file])
+        recorded = sum(stats.calls for stats in instrumentation.recorder.stats.values())
+    finally:
+        instrumentation.recorder.close()
+        instrumentation.recorder = None
+
+    with open(trace_file) as file:
+        assert file.readline() == "[\n"
+        events = [json.loads(line.rstrip(",\n")) for line in file]
+
+    # Each of the 60 files is read twice by a worker; none of those get_object calls may reach the trace
+    assert {event["pid"] for event in events} == {os.getpid()}
+    assert {event["name"] for event in events} == {"s3.ListObjectsV2"}
+    assert len(events) == recorded
+    assert len(open(checkEBSchanges.output_csv_file).readlines()) == LOG_FILES + 1
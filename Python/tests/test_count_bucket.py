@@ -0,0 +1,70 @@
+import csv
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CountBucket"))
+import countBucket
+
+COLUMNS = ["Bucket", "Key", "VersionId", "IsLatest", "IsDeleteMarker", "Size", "StorageClass"]
+ROWS = [
+    ["b", "p/a/current", "v2", "true", "false", "10", "STANDARD"],
+    ["b", "p/a/current", "v1", "false", "false", "7", "STANDARD"],
+    ["b", "p/b/deleted", "v3", "true", "true", "", ""],
+    ["b", "p/b/deleted", "v2", "false", "false", "5", "GLACIER"],
+    ["b", "p/b/kept", "v1", "true", "false", "3", "GLACIER"],
+]
+
+
+def write_manifest(directory, files, columns=COLUMNS):
+    manifest = {"fileFormat": "CSV", "fileSchema": ", ".join(columns),
+                "files": [{"key": f"data/{name}"} for name in files]}
+    path = directory / "manifest.json"
+    path.write_text(json.dumps(manifest))
+    return str(path)
+
+
+def write_data(directory, name, rows):
+    with gzip.open(directory / name, "wt", newline="") as file:
+        csv.writer(file).writerows(rows)
+
+
+def test_csv_inventory_counts_only_current_versions(tmp_path):
+    write_data(tmp_path, "part-0.csv.gz", ROWS)
+
+    totals = countBucket.count_inventory(write_manifest(tmp_path, ["part-0.csv.gz"]), "p/")
+
+    assert totals.objects == 2
+    assert totals.by_sub_prefix() == {"p/a/": [1, 10], "p/b/": [1, 3]}
+    assert totals.failed == []
+
+
+def test_parquet_inventory_counts_only_current_versions(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    table = pa.table({
+        "key": [row[1] for row in ROWS],
+        "is_latest": [row[3] == "true" for row in ROWS],
+        "is_delete_marker": [row[4] == "true" for row in ROWS],
+        "size": [int(row[5]) if row[5] else None for row in ROWS],
+        "storage_class": [row[6] or None for row in ROWS],
+    })
+    pq.write_table(table, tmp_path / "part-0.parquet")
+
+    entries = list(countBucket.iter_inventory_parquet(str(tmp_path / "part-0.parquet"), "p/"))
+
+    assert sorted(entries) == [("p/a/current", 10, "STANDARD"), ("p/b/kept", 3, "GLACIER")]
+
+
+def test_unreadable_inventory_file_fails_the_run(tmp_path, capsys):
+    write_data(tmp_path, "part-0.csv.gz", ROWS)
+    manifest = write_manifest(tmp_path, ["part-0.csv.gz", "missing.csv.gz"])
+
+    with pytest.raises(SystemExit) as exit_info:
+        countBucket.main(["--inventory", manifest, "--prefix", "p/"])
+
+    assert exit_info.value.code == 1
+    assert "INCOMPLETE: 1 prefixes or inventory files" in capsys.readouterr().out
@@ -0,0 +1,63 @@
+import os
+import sys
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tagEC2s"))
+import tag_instances
+
+
+class FakeEC2:
+    """create_tags stand-in that fails for a fixed set of IDs, naming them in the message like EC2."""
+
+    def __init__(self, code, bad_ids):
+        self.code = code
+        self.bad_ids = set(bad_ids)
+        self.calls = []
+
+    def create_tags(self, Resources, Tags):
+        self.calls.append(list(Resources))
+        if not Resources:
+            raise ClientError({"Error": {"Code": "MissingParameter", "Message": "Resources is required"}}, "CreateTags")
+        bad = [instance_id for instance_id in Resources if instance_id in self.bad_ids]
+        if bad:
+            message = f"The instance IDs '{', '.join(bad)}' do not exist"
+            raise ClientError({"Error": {"Code": self.code, "Message": message}}, "CreateTags")
+
+
+def instance_ids(count):
+    return [f"i-{index:017x}" for index in range(count)]
+
+
+def test_error_naming_every_id_in_the_chunk_sends_no_empty_call():
+    ids = instance_ids(3)
+    ec2 = FakeEC2("InvalidInstanceID.NotFound", ids)
+
+    tagged, failed = tag_instances.create_tags_in_chunks(ec2, ids, {"team": "a"})
+
+    assert tagged == 0
+    assert sorted(failed) == ids
+    assert all(error.startswith("InvalidInstanceID.NotFound") for error in failed.values())
+    assert ec2.calls == [ids]
+
+
+def test_named_ids_are_dropped_and_the_rest_tagged():
+    ids = instance_ids(10)
+    ec2 = FakeEC2("InvalidInstanceID.NotFound", ids[3:5])
+
+    tagged, failed = tag_instances.create_tags_in_chunks(ec2, ids, {"team": "a"})
+
+    assert tagged == 8
+    assert sorted(failed) == ids[3:5]
+    assert len(ec2.calls) == 2
+
+
+def test_account_wide_error_fails_each_chunk_once():
+    ids = instance_ids(2000)
+    ec2 = FakeEC2("UnauthorizedOperation", ids)
+
+    tagged, failed = tag_instances.create_tags_in_chunks(ec2, ids, {"team": "a"})
+
+    assert tagged == 0
+    assert len(failed) == 2000
+    assert len(ec2.calls) == len(ids) // tag_instances.TAG_CHUNK_SIZE